@@ -0,0 +1,56 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except ValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def get_objects(self, pks):
+        return self.get_queryset().in_bulk(pks)
+
+    def get_missing_message(self, pk):
+        return self.error_messages['does_not_exist'].format(pk_value=pk)
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        objects = self.child_relation.get_objects(pks)
+        for pk in pks:
+            if pk not in objects:
+                raise serializers.ValidationError(
+                    self.child_relation.get_missing_message(pk),
+                    code='does_not_exist',
+                )
+        return [objects[pk] for pk in pks]
+
+
+class ImageVariantField(serializers.ImageField):
+
+    def __init__(self, fallback, **kwargs):
+        self.fallback = fallback
+        super().__init__(read_only=True, **kwargs)
+
+    def get_attribute(self, instance):
+        return (
+            super().get_attribute(instance)
+            or getattr(instance, self.fallback)
+        )
+
+
+class UploadedImageField(Base64ImageField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return serializers.ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
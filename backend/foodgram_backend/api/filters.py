@@ -1,14 +1,24 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Product, Recipe
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from recipes.search import search_recipes
+from recipes.versions import TAG_VERSION, get_version
 
+from .user_collections import get_collection_ids
 
-class ProductFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
+TAG_IDS_CACHE_KEY = 'tag_ids_by_slug:{version}'
 
-    class Meta:
-        model = Product
-        fields = ('name',)
+
+def get_tag_ids(slugs):
+    key = TAG_IDS_CACHE_KEY.format(version=get_version(TAG_VERSION))
+    tag_ids = cache.get(key)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(key, tag_ids, settings.API_CACHE_TIMEOUT)
+    return [tag_ids[slug] for slug in slugs if slug in tag_ids]
 
 
 class RecipeFilter(filters.FilterSet):
@@ -17,24 +27,39 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'author', 'tags', 'is_in_shopping_cart')
+        fields = (
+            'is_favorited', 'author', 'tags', 'is_in_shopping_cart', 'search',
+        )
 
-    def filter_is_favorited(self, recipes, field_name, value):
+    def filter_by_collection(self, recipes, collection_model, value):
+        recipe_ids = get_collection_ids(self.request, collection_model)
         if value:
-            return recipes.filter(is_favorited=True)
-        return recipes.filter(is_favorited=False)
+            return recipes.filter(id__in=recipe_ids)
+        return recipes.exclude(id__in=recipe_ids)
+
+    def filter_is_favorited(self, recipes, field_name, value):
+        return self.filter_by_collection(recipes, Favorite, value)
 
     def filter_tags(self, recipes, name, value):
         tags = self.request.query_params.getlist('tags')
         if not tags:
             return recipes
-        recipes.prefetch_related('tags__slug')
-        return recipes.filter(tags__slug__in=tags).distinct()
+        tag_ids = get_tag_ids(tags)
+        if not tag_ids:
+            return recipes.none()
+        return recipes.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=tag_ids,
+            )
+        ))
 
     def filter_is_in_shopping_cart(self, recipes, field_name, value):
-        if value:
-            return recipes.filter(is_in_shopping_cart=True)
-        return recipes.filter(is_in_shopping_cart=False)
+        return self.filter_by_collection(recipes, ShoppingCart, value)
+
+    def filter_search(self, recipes, name, value):
+        return search_recipes(recipes, value)
@@ -0,0 +1,110 @@
+import random
+import statistics
+import time
+from itertools import islice
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe, Tag, User
+
+TAGS_MAX = 5
+
+
+class Command(BaseCommand):
+    help = 'Замеряет ленту рецептов с фильтром по 1–5 тегам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--create',
+            type=int,
+            default=0,
+            help='Создать перед замером столько рецептов-заглушек '
+                 '(только для тестовой базы)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=6,
+            help='Размер страницы',
+        )
+
+    def create_recipes(self, count, tag_ids, batch_size=1000):
+        author, _ = User.objects.get_or_create(
+            username='benchmark',
+            defaults={'email': 'benchmark@foodgram.ru'},
+        )
+        recipes = (
+            Recipe(
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                author=author,
+            )
+            for number in range(count)
+        )
+        while True:
+            batch = list(islice(recipes, batch_size))
+            if not batch:
+                return
+            with transaction.atomic():
+                Recipe.objects.bulk_create(batch)
+                recipe_ids = author.recipes.order_by('-id').values_list(
+                    'id', flat=True
+                )[:len(batch)]
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in random.sample(
+                        tag_ids, random.randint(1, len(tag_ids))
+                    )
+                )
+
+    def measure(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
+
+    def handle(self, *args, **kwargs):
+        if kwargs['repeat'] < 1 or kwargs['limit'] < 1:
+            raise CommandError('--repeat и --limit должны быть положительными')
+        tags = list(Tag.objects.order_by('id')[:TAGS_MAX])
+        if len(tags) < TAGS_MAX:
+            raise CommandError(f'Для замера нужно не меньше {TAGS_MAX} тегов')
+        if kwargs['create']:
+            self.create_recipes(kwargs['create'], [tag.id for tag in tags])
+        self.stdout.write(f'Рецептов в базе: {Recipe.objects.count()}')
+        for tags_count in range(1, TAGS_MAX + 1):
+            request = Request(RequestFactory().get('/api/recipes/', {
+                'tags': [tag.slug for tag in tags[:tags_count]],
+            }))
+            request.user = AnonymousUser()
+            recipes = RecipeFilter(
+                request.query_params,
+                queryset=Recipe.objects.all(),
+                request=request,
+            ).qs
+            count, count_time = self.measure(recipes.count, kwargs['repeat'])
+            _, page_time = self.measure(
+                lambda: list(recipes.order_by('-pub_date', '-id')[
+                    :kwargs['limit']
+                ]),
+                kwargs['repeat'],
+            )
+            self.stdout.write(
+                f'Тегов: {tags_count}, найдено: {count}, '
+                f'COUNT: {count_time:.1f} мс, страница: {page_time:.1f} мс'
+            )
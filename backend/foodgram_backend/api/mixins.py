@@ -0,0 +1,126 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.response import Response
+
+from recipes.versions import DATA_VERSION, USER_VERSION, get_version
+
+
+def get_normalized_url(request):
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+    return f'{request.get_host()}{request.path}?{query}'
+
+
+def get_result_items(data):
+    if isinstance(data, dict):
+        return data.get('results', [data])
+    return data
+
+
+class LiveFieldsMixin:
+    live_fields = ()
+
+    def get_live_stamp(self, data):
+        return ','.join(
+            ':'.join(str(item.get(name)) for name in ('id', *self.live_fields))
+            for item in get_result_items(data)
+        )
+
+    def overlay_live_fields(self, data):
+        items = {item['id']: item for item in get_result_items(data)}
+        if not self.live_fields or not items:
+            return data
+        for pk, *values in self.queryset.model.objects.filter(
+            id__in=items
+        ).values_list('id', *self.live_fields):
+            items[pk].update(zip(self.live_fields, values))
+        return data
+
+
+class AnonymousResponseCacheMixin(LiveFieldsMixin):
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_response_cache_key(self, request):
+        return 'response:{version}:{digest}'.format(
+            version=get_version(DATA_VERSION),
+            digest=hashlib.md5(
+                get_normalized_url(request).encode()
+            ).hexdigest(),
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(self.overlay_live_fields(data))
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        return response
+
+
+class ConditionalResponseMixin(LiveFieldsMixin):
+    etag_per_user = False
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_etag_versions(self, request):
+        versions = [get_version(DATA_VERSION)]
+        if self.etag_per_user and request.user.is_authenticated:
+            versions.append(get_version(
+                USER_VERSION.format(user_id=request.user.id)
+            ))
+        return versions
+
+    def get_etag(self, request, data=None):
+        stamp = '{versions}:{url}:{live}'.format(
+            versions=':'.join(map(str, self.get_etag_versions(request))),
+            url=get_normalized_url(request),
+            live=self.get_live_stamp(data) if data is not None else '',
+        )
+        return '"{}"'.format(hashlib.md5(stamp.encode()).hexdigest())
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        response = None
+        if not self.live_fields:
+            etag = self.get_etag(request)
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        if self.live_fields:
+            etag = self.get_etag(request, response.data)
+            response = get_conditional_response(
+                request, etag=etag, response=response
+            )
+        response['ETag'] = etag
+        if self.etag_per_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
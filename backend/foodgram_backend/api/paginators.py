@@ -1,6 +1,132 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.constants import PAGE_SIZE_MAX
+from recipes.timelines import get_feed_recipe_ids
+
+
+class KeysetPaginatorMixin:
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор'
+    keyset_ordering = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.cursor_query_param in request.query_params
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.keyset_ordering)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(
+                self.get_keyset_filter(self.decode_cursor(queryset, cursor))
+            )
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor,
+        )
+
+    def get_keyset_fields(self):
+        return [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.keyset_ordering
+        ]
+
+    def get_keyset_filter(self, position):
+        keyset_filter = Q()
+        equal_fields = {}
+        for name, descending in self.get_keyset_fields():
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            keyset_filter |= Q(**equal_fields, **{lookup: position[name]})
+            equal_fields[name] = position[name]
+        return keyset_filter
 
+    def encode_cursor(self, instance):
+        values = [
+            instance._meta.get_field(name).value_to_string(instance)
+            for name, _ in self.get_keyset_fields()
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
 
-class UserPaginator(PageNumberPagination):
+    def decode_cursor(self, queryset, cursor):
+        fields = self.get_keyset_fields()
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return {
+                name: queryset.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(fields, values)
+            }
+        except (TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class UserPaginator(KeysetPaginatorMixin, PageNumberPagination):
     page_size_query_param = 'limit'
+    max_page_size = PAGE_SIZE_MAX
     page_size = 6
+    keyset_ordering = ('username', 'id')
+
+
+class RecipePaginator(KeysetPaginatorMixin, PageNumberPagination):
+    page_size_query_param = 'limit'
+    max_page_size = PAGE_SIZE_MAX
+    keyset_ordering = ('-pub_date', '-id')
+
+
+class FeedPaginator(RecipePaginator):
+    page_size = 6
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        recipe_ids = get_feed_recipe_ids(
+            request.user.id,
+            self.decode_cursor(queryset, cursor) if cursor else None,
+            page_size + 1,
+        )
+        recipes = queryset.in_bulk(recipe_ids)
+        page = [recipes[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes]
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
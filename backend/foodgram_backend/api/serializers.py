@@ -1,12 +1,27 @@
+import json
+from functools import partial
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.utils import html
 
+from recipes.background import run_batch_in_background
 from recipes.constants import (
-    COOKING_TIME_MIN_VALUE, INGREDIENT_AMOUNT_MIN_VALUE
+    COLLECTION_BULK_MAX, COOKING_TIME_MIN_VALUE, INGREDIENT_AMOUNT_MIN_VALUE,
+    PANTRY_PRODUCTS_MAX, PANTRY_RECIPES_LIMIT, RECIPES_LIMIT_MAX
 )
-from recipes.models import Ingredient, Product, Recipe, Tag
+from recipes.models import (Favorite, Ingredient, Product, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.shopping_lists import track_recipes_ingredients
+from recipes.similarity import update_similar_recipes
+from recipes.versions import RECIPE_PRODUCTS_VERSION, bump_version
+
+from .fields import (BulkManyRelatedField, BulkPrimaryKeyRelatedField,
+                     ImageVariantField, UploadedImageField)
+from .user_collections import get_collection_ids
+from .utils import get_recipes_limit
 
 User = get_user_model()
 
@@ -17,26 +32,42 @@ class UserSerializer(DjoserUserSerializer):
         'get_avatar',
         read_only=True,
     )
+    avatar_thumbnail = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = (*DjoserUserSerializer.Meta.fields, 'is_subscribed', 'avatar')
+        fields = (
+            *DjoserUserSerializer.Meta.fields,
+            'is_subscribed', 'avatar', 'avatar_thumbnail',
+        )
 
     def get_is_subscribed(self, author):
         request = self.context.get('request')
         return (
             request.user.is_authenticated
-            and request.user.followers.filter(author=author).exists()
+            and author.id in self.get_followed_author_ids(request)
         )
 
+    def get_followed_author_ids(self, request):
+        if not hasattr(request, 'followed_author_ids'):
+            request.followed_author_ids = set(
+                request.user.followers.values_list('author_id', flat=True)
+            )
+        return request.followed_author_ids
+
     def get_avatar(self, user):
         if user.avatar:
             return user.avatar.url
         return None
 
+    def get_avatar_thumbnail(self, user):
+        if user.avatar_thumbnail:
+            return user.avatar_thumbnail.url
+        return self.get_avatar(user)
+
 
 class AvatarUpdateSerializer(serializers.ModelSerializer):
-    avatar = Base64ImageField(
+    avatar = UploadedImageField(
         required=True,
         allow_null=False,
     )
@@ -46,39 +77,69 @@ class AvatarUpdateSerializer(serializers.ModelSerializer):
         fields = ('avatar', )
 
     def update(self, instance, validated_data):
-        if instance.avatar:
-            instance.avatar.delete()
         instance.avatar = validated_data['avatar']
         instance.save()
         return instance
 
 
 class RecipePreviewSerializer(serializers.ModelSerializer):
+    image_thumbnail = ImageVariantField(fallback='image')
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumbnail', 'cooking_time')
+        read_only_fields = fields
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=COLLECTION_BULK_MAX,
+    )
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    products = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_PRODUCTS_MAX,
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=RECIPES_LIMIT_MAX,
+        default=PANTRY_RECIPES_LIMIT,
+    )
+
+
+class PantryRecipeSerializer(RecipePreviewSerializer):
+    matched = serializers.IntegerField()
+    missing = serializers.IntegerField()
+    coverage = serializers.FloatField()
+
+    class Meta(RecipePreviewSerializer.Meta):
+        fields = (
+            *RecipePreviewSerializer.Meta.fields,
+            'matched', 'missing', 'coverage',
+        )
         read_only_fields = fields
 
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = (*UserSerializer.Meta.fields, 'recipes', 'recipes_count')
 
     def get_recipes(self, author):
-        recipes_limit = self.context.get(
-            'request'
-        ).GET.get('recipes_limit', 10**10)
-        try:
-            recipes_limit = int(recipes_limit)
-        except (ValueError, TypeError):
-            recipes_limit = 10**10
-        recipes = author.recipes.all()[:recipes_limit]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author[author.id]
+        else:
+            recipes = author.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))
+            ]
         return RecipePreviewSerializer(recipes, many=True).data
 
 
@@ -94,8 +155,39 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class IngredientListSerializer(serializers.ListSerializer):
+
+    def get_value(self, dictionary):
+        if html.is_html_input(dictionary) and self.field_name in dictionary:
+            try:
+                return json.loads(dictionary[self.field_name])
+            except ValueError:
+                return dictionary[self.field_name]
+        return super().get_value(dictionary)
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        id_field = self.child.fields['id']
+        products = id_field.get_objects(
+            [ingredient['id'] for ingredient in ingredients]
+        )
+        errors = [
+            {} if ingredient['id'] in products
+            else {'id': [serializers.ErrorDetail(
+                id_field.get_missing_message(ingredient['id']),
+                code='does_not_exist',
+            )]}
+            for ingredient in ingredients
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        for ingredient in ingredients:
+            ingredient['id'] = products[ingredient['id']]
+        return ingredients
+
+
 class IngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Product.objects.all(),
     )
     amount = serializers.IntegerField(min_value=INGREDIENT_AMOUNT_MIN_VALUE)
@@ -103,6 +195,7 @@ class IngredientWriteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'amount')
+        list_serializer_class = IngredientListSerializer
 
     def to_representation(self, instance):
         return IngredientReadSerializer(
@@ -121,31 +214,52 @@ class IngredientReadSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='product.id')
+    name = serializers.CharField(source='product.name')
+    measurement_unit = serializers.CharField(source='product.measurement_unit')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+        read_only_fields = fields
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = IngredientReadSerializer(many=True)
-    is_favorited = serializers.BooleanField(read_only=True, default=False)
-    is_in_shopping_cart = serializers.BooleanField(
-        read_only=True,
-        default=False,
-    )
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
     tags = TagSerializer(many=True)
+    image_thumbnail = ImageVariantField(fallback='image')
+    image_detail = ImageVariantField(fallback='image')
 
     class Meta:
         model = Recipe
         fields = (
-            'id', 'ingredients', 'tags', 'image',
+            'id', 'ingredients', 'tags',
+            'image', 'image_thumbnail', 'image_detail',
             'name', 'text', 'cooking_time', 'author',
-            'is_favorited', 'is_in_shopping_cart',
+            'is_favorited', 'is_in_shopping_cart', 'favorites_count',
         )
         read_only_fields = fields
 
+    def get_is_favorited(self, recipe):
+        return recipe.id in get_collection_ids(
+            self.context.get('request'), Favorite
+        )
+
+    def get_is_in_shopping_cart(self, recipe):
+        return recipe.id in get_collection_ids(
+            self.context.get('request'), ShoppingCart
+        )
+
 
 class RecipeCreateUpdateSerializer(RecipeReadSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(), many=True
+    tags = BulkManyRelatedField(
+        child_relation=BulkPrimaryKeyRelatedField(queryset=Tag.objects.all())
     )
-    image = Base64ImageField(
+    image = UploadedImageField(
         required=True,
         allow_null=False,
     )
@@ -160,6 +274,8 @@ class RecipeCreateUpdateSerializer(RecipeReadSerializer):
         )
 
     def to_representation(self, instance):
+        if hasattr(self, 'saved_relations'):
+            self.set_prefetched_relations(instance, *self.saved_relations)
         return RecipeReadSerializer(
             context=self.context
         ).to_representation(instance)
@@ -194,7 +310,7 @@ class RecipeCreateUpdateSerializer(RecipeReadSerializer):
         return super().validate(attrs)
 
     def set_ingredients(self, recipe, ingredients_data):
-        Ingredient.objects.bulk_create(
+        return Ingredient.objects.bulk_create(
             Ingredient(
                 product=ingredient['id'],
                 amount=ingredient['amount'],
@@ -202,26 +318,94 @@ class RecipeCreateUpdateSerializer(RecipeReadSerializer):
             ) for ingredient in ingredients_data
         )
 
-    def update(self, instance: Recipe, validated_data):
-        instance.ingredients.clear()
-        self.set_ingredients(
-            instance,
-            ingredients_data=validated_data.pop('ingredients')
+    def set_prefetched_objects(self, recipe, related_name, objects):
+        queryset = getattr(recipe, related_name).all()
+        queryset._result_cache = list(objects)
+        queryset._prefetch_done = True
+        if not hasattr(recipe, '_prefetched_objects_cache'):
+            recipe._prefetched_objects_cache = {}
+        recipe._prefetched_objects_cache[related_name] = queryset
+
+    def set_prefetched_relations(self, recipe, ingredients, tags):
+        self.set_prefetched_objects(recipe, 'ingredients', sorted(
+            ingredients, key=lambda ingredient: ingredient.product.name
+        ))
+        self.set_prefetched_objects(
+            recipe, 'tags', sorted(tags, key=lambda tag: tag.name)
         )
-        instance.tags.clear()
-        instance.tags.set(validated_data.pop('tags'))
+
+    def update_ingredients(self, recipe, ingredients_data):
+        products = {
+            ingredient['id'].id: ingredient['id']
+            for ingredient in ingredients_data
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        current = {}
+        deleted_ids = []
+        changed = []
+        for ingredient in recipe.ingredients.all():
+            if (
+                ingredient.product_id not in amounts
+                or ingredient.product_id in current
+            ):
+                deleted_ids.append(ingredient.id)
+                continue
+            ingredient.product = products[ingredient.product_id]
+            current[ingredient.product_id] = ingredient
+            if ingredient.amount != amounts[ingredient.product_id]:
+                ingredient.amount = amounts[ingredient.product_id]
+                changed.append(ingredient)
+        if deleted_ids:
+            Ingredient.objects.filter(id__in=deleted_ids).delete()
+        Ingredient.objects.bulk_update(changed, ['amount'])
+        created = Ingredient.objects.bulk_create(
+            Ingredient(product=products[product_id], amount=amount,
+                       recipe=recipe)
+            for product_id, amount in amounts.items()
+            if product_id not in current
+        )
+        if created:
+            transaction.on_commit(
+                partial(bump_version, RECIPE_PRODUCTS_VERSION)
+            )
+            run_batch_in_background(update_similar_recipes, [recipe.id])
+        return [*current.values(), *created]
+
+    def update_tags(self, recipe, tags):
+        current_ids = set(recipe.tags.values_list('id', flat=True))
+        new_ids = {tag.id for tag in tags}
+        if current_ids - new_ids:
+            recipe.tags.remove(*(current_ids - new_ids))
+        if new_ids - current_ids:
+            recipe.tags.add(*(new_ids - current_ids))
+
+    @transaction.atomic
+    def update(self, instance: Recipe, validated_data):
+        tags = validated_data.pop('tags')
+        with track_recipes_ingredients([instance.id]):
+            ingredients = self.update_ingredients(
+                instance,
+                ingredients_data=validated_data.pop('ingredients')
+            )
+        self.update_tags(instance, tags)
+        self.saved_relations = (ingredients, tags)
         return super().update(
             instance,
             validated_data,
         )
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         recipe = super().create(validated_data)
-        self.set_ingredients(
+        ingredients = self.set_ingredients(
             recipe,
             ingredients_data=ingredients_data,
         )
         recipe.tags.set(tags)
+        self.saved_relations = (ingredients, tags)
         return recipe
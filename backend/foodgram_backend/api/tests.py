@@ -0,0 +1,627 @@
+import base64
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import tracemalloc
+from itertools import islice
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from recipes.indexes import pantry_index
+from recipes.models import (Follow, Ingredient, Product, Recipe,
+                            SimilarRecipe, StoredFile, Tag, TimelineEntry,
+                            User)
+from recipes.similarity import rebuild_similar_recipes
+from recipes.timelines import (push_author_to_timeline,
+                               push_recipe_to_timelines)
+from recipes.versions import (DATA_VERSION, RECIPE_PRODUCTS_VERSION,
+                              TAG_VERSION, get_version)
+
+from .paginators import RecipePaginator
+
+
+@override_settings(
+    BACKGROUND_WORKERS=0,
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }},
+)
+class RecipeTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@foodgram.ru',
+                username=f'user{number}',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.products = [
+            Product.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.recipes = [
+            cls.create_recipe(cls.users[number % 3], cls.products[:3])
+            for number in range(12)
+        ]
+
+    @classmethod
+    def create_recipe(cls, author, products):
+        recipe = Recipe.objects.create(
+            name='Рецепт',
+            author=author,
+            image='recipes/image/image.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(recipe=recipe, product=product, amount=100)
+            for product in products
+        )
+        recipe.tags.set(cls.tags[:2])
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = self.client_class()
+        self.author_client.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+            Token.objects.create(user=self.users[0]).key
+        ))
+
+    def patch_recipe(self, recipe, products, name='Рецепт'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {
+                    'ingredients': [
+                        {'id': product.id, 'amount': 100}
+                        for product in products
+                    ],
+                    'tags': [self.tags[0].id],
+                    'name': name,
+                    'text': recipe.text,
+                    'cooking_time': recipe.cooking_time,
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class RecipeQueriesTest(RecipeTestCase):
+    ANONYMOUS_LIST_QUERIES = 4
+    AUTHENTICATED_LIST_QUERIES = 8
+    ANONYMOUS_RETRIEVE_QUERIES = 3
+    AUTHENTICATED_RETRIEVE_QUERIES = 7
+
+    def assert_list_queries(self, client, queries):
+        for limit in (2, 10):
+            cache.clear()
+            with self.assertNumQueries(queries):
+                response = client.get('/api/recipes/', {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+
+    def assert_retrieve_queries(self, client, queries):
+        with self.assertNumQueries(queries):
+            response = client.get(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(len(response.data['ingredients']), 3)
+
+    def test_anonymous_list_queries(self):
+        self.assert_list_queries(self.client, self.ANONYMOUS_LIST_QUERIES)
+
+    def test_authenticated_list_queries(self):
+        self.assert_list_queries(
+            self.author_client, self.AUTHENTICATED_LIST_QUERIES
+        )
+
+    def test_anonymous_retrieve_queries(self):
+        self.assert_retrieve_queries(
+            self.client, self.ANONYMOUS_RETRIEVE_QUERIES
+        )
+
+    def test_authenticated_retrieve_queries(self):
+        self.assert_retrieve_queries(
+            self.author_client, self.AUTHENTICATED_RETRIEVE_QUERIES
+        )
+
+
+class RecipePaginationTest(RecipeTestCase):
+
+    def test_limit_is_capped(self):
+        with patch.object(RecipePaginator, 'max_page_size', 5):
+            response = self.client.get('/api/recipes/', {'limit': 1000000})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def walk_cursor_pages(self, url, limit):
+        ids = []
+        response = self.client.get(url, {'cursor': '', 'limit': limit})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), limit)
+            ids.extend(item['id'] for item in response.data['results'])
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_recipe_cursor_pages(self):
+        Recipe.objects.filter(id__in=[
+            recipe.id for recipe in self.recipes[:6]
+        ]).update(pub_date=self.recipes[0].pub_date)
+        self.assertEqual(
+            self.walk_cursor_pages('/api/recipes/', 5),
+            list(Recipe.objects.order_by(
+                '-pub_date', '-id'
+            ).values_list('id', flat=True)),
+        )
+
+    def test_user_cursor_pages(self):
+        self.assertEqual(
+            self.walk_cursor_pages('/api/users/', 2),
+            list(User.objects.order_by(
+                'username', 'id'
+            ).values_list('id', flat=True)),
+        )
+
+    def test_malformed_cursor(self):
+        for url in ('/api/recipes/', '/api/users/'):
+            for cursor in ('not-base64!', 'WzFd', 'eyJhIjogMX0='):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404, cursor)
+
+
+class TagFilterTest(RecipeTestCase):
+
+    def get_recipe_ids(self, tags):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', {
+                'tags': [tag.slug for tag in tags], 'limit': 100,
+            })
+        self.queries = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "recipes_recipe"' in query['sql']
+        ]
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_tags_filter_is_a_semi_join(self):
+        recipe = self.create_recipe(self.users[1], self.products[:1])
+        recipe.tags.set(self.tags[1:])
+        recipe_ids = self.get_recipe_ids(self.tags)
+        self.assertCountEqual(
+            recipe_ids, [recipe.id for recipe in self.recipes] + [recipe.id]
+        )
+        self.assertTrue(self.queries)
+        for sql in self.queries:
+            self.assertIn('EXISTS', sql)
+            self.assertNotIn('DISTINCT', sql)
+        self.assertEqual(self.get_recipe_ids(self.tags[2:]), [recipe.id])
+
+    def test_tag_ids_survive_recipe_writes(self):
+        version = get_version(TAG_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe(self.users[1], self.products[:1])
+        self.assertEqual(get_version(TAG_VERSION), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Новый тег', slug='new')
+        self.assertNotEqual(get_version(TAG_VERSION), version)
+
+
+class DataVersionTest(RecipeTestCase):
+
+    def test_login_keeps_data_version(self):
+        version = get_version(DATA_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/login/', {
+                'email': self.users[1].email,
+                'password': 'password',
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_version(DATA_VERSION), version)
+
+    def test_profile_change_bumps_data_version(self):
+        version = get_version(DATA_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[1].first_name = 'Новое имя'
+            self.users[1].save()
+        self.assertNotEqual(get_version(DATA_VERSION), version)
+
+    def test_favorite_keeps_cached_response(self):
+        recipe = self.recipes[-1]
+        self.client.get('/api/recipes/')
+        version = get_version(DATA_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(get_version(DATA_VERSION), version)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            {
+                item['id']: item['favorites_count']
+                for item in response.data['results']
+            }[recipe.id],
+            1,
+        )
+
+
+class ConditionalResponseTest(RecipeTestCase):
+
+    def test_favorite_changes_etag(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.post(f'{url}favorite/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['favorites_count'], 1)
+
+
+class RecipeUpdateWritesTest(RecipeTestCase):
+    WRITE_PATTERNS = {
+        'INSERT': r'INSERT (OR IGNORE )?INTO "{table}"',
+        'UPDATE': r'UPDATE "{table}"',
+        'DELETE': r'DELETE FROM "{table}"',
+    }
+    UNCHANGED_QUERIES = 16
+
+    def update_recipe(self, amounts, tags=None):
+        recipe = self.recipes[0]
+        with CaptureQueriesContext(connection) as context:
+            response = self.author_client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {
+                    'ingredients': [
+                        {'id': product.id, 'amount': amount}
+                        for product, amount in amounts
+                    ],
+                    'tags': [tag.id for tag in (tags or self.tags[:2])],
+                    'name': recipe.name,
+                    'text': recipe.text,
+                    'cooking_time': recipe.cooking_time,
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.queries = context.captured_queries
+        return response
+
+    def get_writes(self, table):
+        return {
+            kind: sum(
+                bool(re.match(pattern.format(table=table), query['sql']))
+                for query in self.queries
+            )
+            for kind, pattern in self.WRITE_PATTERNS.items()
+        }
+
+    def assert_writes(self, table, inserts=0, updates=0, deletes=0):
+        self.assertEqual(
+            self.get_writes(table),
+            {'INSERT': inserts, 'UPDATE': updates, 'DELETE': deletes},
+        )
+
+    def test_unchanged_payload_writes_nothing(self):
+        self.update_recipe([(product, 100) for product in self.products[:3]])
+        self.assert_writes('recipes_ingredient')
+        self.assert_writes('recipes_recipe_tags')
+        self.assertEqual(len(self.queries), self.UNCHANGED_QUERIES)
+
+    def test_amount_change_is_one_update(self):
+        self.update_recipe([
+            (self.products[0], 150),
+            *((product, 100) for product in self.products[1:3]),
+        ])
+        self.assert_writes('recipes_ingredient', updates=1)
+        self.assert_writes('recipes_recipe_tags')
+
+    def test_added_ingredient_is_one_insert(self):
+        response = self.update_recipe(
+            [(product, 100) for product in self.products[:4]]
+        )
+        self.assert_writes('recipes_ingredient', inserts=1)
+        self.assertEqual(len(response.data['ingredients']), 4)
+
+    def test_removed_ingredient_is_one_delete(self):
+        response = self.update_recipe(
+            [(product, 100) for product in self.products[:2]]
+        )
+        self.assert_writes('recipes_ingredient', deletes=1)
+        self.assertEqual(len(response.data['ingredients']), 2)
+
+    def test_changed_tags_are_one_insert_and_one_delete(self):
+        self.update_recipe(
+            [(product, 100) for product in self.products[:3]],
+            tags=self.tags[1:],
+        )
+        self.assert_writes('recipes_ingredient')
+        self.assert_writes('recipes_recipe_tags', inserts=1, deletes=1)
+
+
+class MediaTestCase(RecipeTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @staticmethod
+    def make_image(size, pixels=None):
+        buffer = io.BytesIO()
+        width, height = size
+        Image.frombytes(
+            'RGB', size, pixels or os.urandom(width * height * 3)
+        ).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def get_media_files(self):
+        return [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(self.media_root)
+            for name in names
+        ]
+
+
+class ImageUploadMemoryTest(MediaTestCase):
+    IMAGE_SIZE = (1500, 1500)
+    MULTIPART_PEAK_RATIO = 3
+    BASE64_PEAK_RATIO = 9
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.image = cls.make_image(cls.IMAGE_SIZE)
+
+    def get_recipe_data(self):
+        return {
+            'tags': [self.tags[0].id],
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def measure_peak(self, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            response = self.author_client.post(
+                '/api/recipes/', *args, **kwargs
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(response.status_code, 201, response.data)
+        return peak
+
+    def test_multipart_upload_memory(self):
+        data = {
+            **self.get_recipe_data(),
+            'ingredients': json.dumps([
+                {'id': self.products[0].id, 'amount': 100}
+            ]),
+            'image': SimpleUploadedFile('image.png', self.image, 'image/png'),
+        }
+        self.assertLess(
+            self.measure_peak(data, format='multipart'),
+            len(self.image) * self.MULTIPART_PEAK_RATIO,
+        )
+
+    def test_base64_upload_memory(self):
+        body = json.dumps({
+            **self.get_recipe_data(),
+            'ingredients': [{'id': self.products[0].id, 'amount': 100}],
+            'image': 'data:image/png;base64,{}'.format(
+                base64.b64encode(self.image).decode()
+            ),
+        })
+        self.assertLess(
+            self.measure_peak(body, content_type='application/json'),
+            len(self.image) * self.BASE64_PEAK_RATIO,
+        )
+
+
+class ImageReferencesTest(MediaTestCase):
+
+    def encode_image(self, pixel):
+        return 'data:image/png;base64,{}'.format(base64.b64encode(
+            self.make_image((8, 8), pixel * 64)
+        ).decode())
+
+    def send(self, method, url, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.author_client, method)(url, {
+                'ingredients': [{'id': self.products[0].id, 'amount': 100}],
+                'tags': [self.tags[0].id],
+                'image': image,
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+            }, format='json')
+        self.assertIn(response.status_code, (200, 201), response.data)
+        return Recipe.objects.get(id=response.data['id'])
+
+    def get_references(self, name):
+        return StoredFile.objects.filter(name=name).values_list(
+            'references', flat=True
+        ).first()
+
+    def test_replaced_images_are_released(self):
+        first_image = self.encode_image(b'\xff\x00\x00')
+        recipe = self.send('post', '/api/recipes/', first_image)
+        url = f'/api/recipes/{recipe.id}/'
+        first_name = recipe.image.name
+        for _ in range(3):
+            self.send('patch', url, first_image)
+        self.assertEqual(self.get_references(first_name), 1)
+        second_name = self.send(
+            'patch', url, self.encode_image(b'\x00\xff\x00')
+        ).image.name
+        self.assertIsNone(self.get_references(first_name))
+        self.assertFalse(recipe.image.storage.exists(first_name))
+        self.assertEqual(self.get_references(second_name), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(StoredFile.objects.exists())
+        self.assertEqual(self.get_media_files(), [])
+
+
+class FeedTest(RecipeTestCase):
+
+    def get_feed_ids(self):
+        response = self.author_client.get('/api/recipes/feed/')
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def follow(self, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Follow.objects.create(follower=self.users[0], author=author)
+
+    def test_pulled_recipes_stay_after_author_shrinks(self):
+        self.follow(self.users[1])
+        with patch('recipes.timelines.TIMELINE_PULL_RECIPES_MIN', 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = self.create_recipe(self.users[1], self.products[:1])
+        self.assertFalse(
+            TimelineEntry.objects.filter(recipe=recipe).exists()
+        )
+        self.assertEqual(self.get_feed_ids()[0], recipe.id)
+
+    def test_late_backfill_after_unfollow_is_hidden(self):
+        Recipe.objects.filter(author=self.users[1]).update(
+            pushed_to_timelines=True
+        )
+        self.follow(self.users[1]).delete()
+        push_author_to_timeline(self.users[0].id, self.users[1].id)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.users[0]).exists()
+        )
+        self.assertEqual(self.get_feed_ids(), [])
+
+    def test_failed_fan_out_keeps_recipe_pulled(self):
+        self.follow(self.users[1])
+        recipe = self.create_recipe(self.users[1], self.products[:1])
+        with patch.object(
+            TimelineEntry.objects, 'bulk_create', side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                push_recipe_to_timelines(recipe.id)
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.pushed_to_timelines)
+        self.assertEqual(self.get_feed_ids()[0], recipe.id)
+
+    def test_follow_during_fan_out_gets_recipe(self):
+        self.follow(self.users[1])
+        recipe = self.create_recipe(self.users[1], self.products[:1])
+
+        def islice_then_follow(iterable, size):
+            batch = list(islice(iterable, size))
+            if not batch:
+                Follow.objects.bulk_create([
+                    Follow(follower=self.users[2], author=self.users[1])
+                ])
+            return iter(batch)
+
+        with patch('recipes.timelines.islice', islice_then_follow):
+            push_recipe_to_timelines(recipe.id)
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.pushed_to_timelines)
+        self.assertCountEqual(
+            TimelineEntry.objects.filter(recipe=recipe).values_list(
+                'user_id', 'author_id', 'pub_date'
+            ),
+            [
+                (user.id, self.users[1].id, recipe.pub_date)
+                for user in (self.users[0], self.users[2])
+            ],
+        )
+
+
+class SimilarRecipesTest(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rebuild_similar_recipes()
+
+    def get_similar_ids(self, recipe):
+        return set(SimilarRecipe.objects.filter(recipe=recipe).values_list(
+            'similar_id', flat=True
+        ))
+
+    def test_recipe_edit_keeps_similar_recipes(self):
+        with patch('recipes.signals.update_similar_recipes') as update:
+            self.patch_recipe(
+                self.recipes[0], self.products[:3], name='Новое название'
+            )
+        update.assert_not_called()
+
+    def test_added_ingredient_updates_similar_recipes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe(self.users[1], self.products[4:])
+        self.assertNotIn(recipe.id, self.get_similar_ids(self.recipes[0]))
+        with patch('recipes.similarity.SIMILAR_RECIPES_LIMIT', 20):
+            self.patch_recipe(
+                self.recipes[0], [*self.products[:3], *self.products[4:]]
+            )
+        self.assertIn(recipe.id, self.get_similar_ids(self.recipes[0]))
+
+
+class PantryTest(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        pantry_index.version = None
+
+    def get_pantry_ids(self, products):
+        response = self.client.get('/api/recipes/pantry/', {
+            'products': ','.join(str(product.id) for product in products),
+        })
+        return [recipe['id'] for recipe in response.data]
+
+    def test_recipe_edit_keeps_version(self):
+        version = get_version(RECIPE_PRODUCTS_VERSION)
+        self.patch_recipe(
+            self.recipes[0], self.products[:3], name='Новое название'
+        )
+        self.assertEqual(get_version(RECIPE_PRODUCTS_VERSION), version)
+
+    def test_added_ingredient_is_found(self):
+        self.assertEqual(self.get_pantry_ids(self.products[3:4]), [])
+        self.patch_recipe(self.recipes[0], self.products[:4])
+        self.assertEqual(
+            self.get_pantry_ids(self.products[3:4]), [self.recipes[0].id]
+        )
+
+    def test_rebuild_runs_off_the_request(self):
+        stale_ids = self.get_pantry_ids(self.products[:1])
+        with patch('recipes.indexes.submit_task') as submit_task:
+            self.patch_recipe(self.recipes[0], self.products[4:])
+            self.assertEqual(
+                self.get_pantry_ids(self.products[:1]), stale_ids
+            )
+        submit_task.assert_called_once()
+        pantry_index.lock.release()
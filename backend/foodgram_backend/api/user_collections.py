@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.versions import USER_VERSION, get_version
+
+COLLECTION_IDS_CACHE_KEY = '{collection}_ids:{user_id}:{version}'
+
+
+def load_collection_ids(user, collection_model):
+    key = COLLECTION_IDS_CACHE_KEY.format(
+        collection=collection_model._meta.model_name,
+        user_id=user.id,
+        version=get_version(USER_VERSION.format(user_id=user.id)),
+    )
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        recipe_ids = frozenset(
+            collection_model.objects.filter(
+                user=user
+            ).values_list('recipe_id', flat=True)
+        )
+        cache.set(key, recipe_ids, settings.API_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+def get_collection_ids(request, collection_model):
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, 'collection_ids'):
+        request.collection_ids = {}
+    if collection_model not in request.collection_ids:
+        request.collection_ids[collection_model] = load_collection_ids(
+            request.user, collection_model
+        )
+    return request.collection_ids[collection_model]
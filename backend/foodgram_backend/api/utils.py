@@ -1,9 +1,22 @@
+import csv
+import json
+from collections import defaultdict
 from datetime import datetime
 
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.constants import RECIPES_LIMIT_MAX
+from recipes.models import Recipe
+
 PRODUCT_IN_SHOPPING_LIST_FORMAT = (
     '{number}. {product_name}, '
     '{measure} - {amount}'
 )
+RECIPE_IN_SHOPPING_LIST_FORMAT = (
+    'Название: {name}, Ник автора: {author_username}'
+)
+SHOPPING_LIST_CSV_HEADER = ('Продукт', 'Единица измерения', 'Количество')
 RUS_MONTHS = {
     number: name for number, name in enumerate((
         'января', 'февраля', 'марта', 'апреля', 'мая',
@@ -13,23 +26,96 @@ RUS_MONTHS = {
 }
 
 
-def generate_ingredients_file_content(ingredients, recipes):
-    products = [
-        PRODUCT_IN_SHOPPING_LIST_FORMAT.format(
+class LineBuffer:
+
+    def write(self, line):
+        return line
+
+
+def generate_txt_shopping_list(ingredients, recipes):
+    now = datetime.now()
+    yield now.strftime(
+        f'Дата составления списка: %d {RUS_MONTHS[now.month]} %Y.\n'
+        'Время составления списка: %H:%M\n'
+    )
+    yield 'Необходимо купить следующие продукты:\n'
+    for number, ingredient in enumerate(ingredients, start=1):
+        yield PRODUCT_IN_SHOPPING_LIST_FORMAT.format(
             number=number,
             product_name=ingredient['product_name'].capitalize(),
             measure=ingredient['unit'],
             amount=ingredient['total'],
-        ) for number, ingredient in enumerate(ingredients, start=1)
-    ]
-    month = RUS_MONTHS[datetime.now().month]
-    return '\n'.join([
-        datetime.now().strftime(
-            f'Дата составления списка: %d {month} %Y.\n'
-            'Время составления списка: %H:%M'
-        ),
-        'Необходимо купить следующие продукты:',
-        *products,
-        'Для блюд:',
-        *[recipe.__str__() for recipe in recipes],
-    ])
+        ) + '\n'
+    yield 'Для блюд:\n'
+    for recipe in recipes:
+        yield RECIPE_IN_SHOPPING_LIST_FORMAT.format(**recipe) + '\n'
+
+
+def generate_csv_shopping_list(ingredients, recipes):
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(SHOPPING_LIST_CSV_HEADER)
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['product_name'],
+            ingredient['unit'],
+            ingredient['total'],
+        ))
+
+
+def generate_json_shopping_list(ingredients, recipes):
+    yield '{"products": ['
+    for number, ingredient in enumerate(ingredients):
+        yield (',' if number else '') + json.dumps({
+            'name': ingredient['product_name'],
+            'measurement_unit': ingredient['unit'],
+            'amount': ingredient['total'],
+        }, ensure_ascii=False)
+    yield '], "recipes": ['
+    for number, recipe in enumerate(recipes):
+        yield (',' if number else '') + json.dumps({
+            'name': recipe['name'],
+            'author': recipe['author_username'],
+        }, ensure_ascii=False)
+    yield ']}'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (generate_txt_shopping_list, 'text/plain; charset=utf-8'),
+    'csv': (generate_csv_shopping_list, 'text/csv; charset=utf-8'),
+    'json': (generate_json_shopping_list, 'application/json'),
+}
+
+
+def get_recipes_limit(request):
+    try:
+        recipes_limit = int(request.GET['recipes_limit'])
+    except (KeyError, ValueError, TypeError):
+        return RECIPES_LIMIT_MAX
+    return max(0, min(recipes_limit, RECIPES_LIMIT_MAX))
+
+
+def get_recipes_previews(author_ids, recipes_limit):
+    recipes_by_author = defaultdict(list)
+    if not author_ids or not recipes_limit:
+        return recipes_by_author
+    previews = Recipe.objects.filter(
+        author_id__in=author_ids
+    ).annotate(
+        preview_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()],
+        )
+    ).order_by().values(
+        'id', 'name', 'image', 'image_thumbnail', 'cooking_time', 'author_id',
+        'preview_number',
+    )
+    sql, params = previews.query.sql_with_params()
+    for recipe in Recipe.objects.raw(
+        f'SELECT * FROM ({sql}) AS previews '
+        'WHERE preview_number <= %s '
+        'ORDER BY author_id, preview_number',
+        (*params, recipes_limit),
+    ):
+        recipes_by_author[recipe.author_id].append(recipe)
+    return recipes_by_author
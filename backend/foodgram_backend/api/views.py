@@ -1,30 +1,37 @@
 from django.contrib.auth import get_user_model
-from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
-                              Value)
-from django.http import FileResponse
+from django.db.models import F, Prefetch
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django_filters import rest_framework as filterset
 from djoser import views
+from recipes.collection_changes import (add_recipes_to_collection,
+                                        remove_recipes_from_collection)
+from recipes.indexes import (catalog_snapshot, pantry_index, product_index,
+                             recipe_id_index)
 from recipes.models import (Favorite, Follow, Ingredient, Product, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.short_links import encode_recipe_id
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from .filters import ProductFilter, RecipeFilter
-from .paginators import UserPaginator
+from .filters import RecipeFilter
+from .mixins import AnonymousResponseCacheMixin, ConditionalResponseMixin
+from .paginators import FeedPaginator, RecipePaginator, UserPaginator
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (AvatarUpdateSerializer, ProductSerializer,
-                          RecipeCreateUpdateSerializer,
+from .serializers import (AvatarUpdateSerializer, PantryQuerySerializer,
+                          PantryRecipeSerializer, ProductSerializer,
+                          RecipeCreateUpdateSerializer, RecipeIdsSerializer,
                           RecipePreviewSerializer, RecipeReadSerializer,
-                          SubscriptionSerializer, TagSerializer,
-                          UserSerializer)
-from .utils import generate_ingredients_file_content
+                          ShoppingListItemSerializer, SubscriptionSerializer,
+                          TagSerializer, UserSerializer)
+from .utils import (SHOPPING_LIST_FORMATS, get_recipes_limit,
+                    get_recipes_previews)
 
 User = get_user_model()
 
@@ -53,7 +60,6 @@ class AccountViewSet(views.UserViewSet):
             return Response(serializer.data)
         if not user.avatar:
             return Response(status=status.HTTP_404_NOT_FOUND)
-        user.avatar.delete()
         user.avatar = None
         user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -94,25 +100,70 @@ class AccountViewSet(views.UserViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request):
+        authors = self.paginate_queryset(
+            User.objects.filter(authors__follower=request.user)
+        )
         return self.get_paginated_response(self.get_serializer(
-            self.paginate_queryset(
-                User.objects.filter(authors__follower=request.user)
-            ),
+            authors,
             many=True,
-            context={'request': request},
+            context={
+                'request': request,
+                'recipes_by_author': get_recipes_previews(
+                    [author.id for author in authors],
+                    get_recipes_limit(request),
+                ),
+            },
         ).data)
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(
+    ConditionalResponseMixin,
+    AnonymousResponseCacheMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (filterset.DjangoFilterBackend,)
-    filterset_class = ProductFilter
 
+    def list(self, request, *args, **kwargs):
+        if 'name' not in request.query_params:
+            return self.get_catalog_response(request)
+        return self.get_conditional_response(self.search, request)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    def get_catalog_response(self, request):
+        digest, content, gzipped_content = catalog_snapshot.get()
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = '"{digest}{suffix}"'.format(
+            digest=digest, suffix='-gzip' if use_gzip else ''
+        )
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                gzipped_content if use_gzip else content,
+                content_type='application/json',
+            )
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def search(self, request):
+        try:
+            limit = max(0, int(request.query_params['limit']))
+        except (KeyError, ValueError):
+            limit = None
+        return Response(
+            product_index.search(request.query_params['name'], limit)
+        )
+
+
+class TagViewSet(
+    ConditionalResponseMixin,
+    AnonymousResponseCacheMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
@@ -120,14 +171,18 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class RecipeViewSet(
-    viewsets.ModelViewSet
+    ConditionalResponseMixin,
+    AnonymousResponseCacheMixin,
+    viewsets.ModelViewSet,
 ):
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateUpdateSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
     filter_backends = (filterset.DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePaginator
+    etag_per_user = True
+    live_fields = ('favorites_count',)
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -136,24 +191,17 @@ class RecipeViewSet(
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        if self.request.user.is_authenticated:
-            return queryset.annotate(
-                is_favorited=Exists(
-                    Favorite.objects.filter(
-                        user=self.request.user,
-                        recipe=OuterRef('pk'),
-                    )
-                ),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user=self.request.user,
-                        recipe=OuterRef('pk'),
-                    )
-                ),
-            )
-        return queryset.annotate(
-            is_favorited=Value(False, output_field=BooleanField()),
-            is_in_shopping_cart=Value(False, output_field=BooleanField()),
+        if self.action in ('list', 'retrieve'):
+            return self.add_read_relations(queryset)
+        return queryset
+
+    def add_read_relations(self, queryset):
+        return queryset.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients',
+                queryset=Ingredient.objects.select_related('product'),
+            ),
         )
 
     def perform_create(self, serializer):
@@ -161,35 +209,108 @@ class RecipeViewSet(
             author=self.request.user,
         )
 
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPaginator,
+    )
+    def feed(self, request):
+        page = self.paginate_queryset(
+            self.add_read_relations(self.get_queryset())
+        )
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
     @action(
         detail=True,
         methods=['GET'],
         url_path='get-link',
     )
     def get_link(self, request, pk):
-        if not Recipe.objects.filter(pk=pk).exists():
-            raise ValidationError(f'Рецепта с {pk=} не существует')
+        recipe = self.get_object()
         return Response(
             {
                 'short-link': request.build_absolute_uri(
                     reverse(
                         'recipes:short_link',
-                        args=[pk],
+                        args=[encode_recipe_id(recipe.id)],
                     )
                 )
             },
             status=status.HTTP_200_OK,
         )
 
-    def add_recipe_to_collection(self, collection_model, recipe):
-        _, created = collection_model.objects.get_or_create(
-            user=self.request.user,
-            recipe=recipe,
+    @action(
+        detail=True,
+        methods=['GET'],
+    )
+    def similar(self, request, pk):
+        recipe_id = self.get_recipe_id()
+        if recipe_id not in recipe_id_index:
+            raise Http404
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=recipe_id
+        ).only(
+            *RecipePreviewSerializer.Meta.fields
+        ).order_by('-similar_to__score', 'id')
+        return Response(RecipePreviewSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ).data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+    )
+    def pantry(self, request):
+        data = {'products': [
+            product_id
+            for value in request.query_params.getlist('products')
+            for product_id in value.split(',')
+            if product_id
+        ]}
+        if 'limit' in request.query_params:
+            data['limit'] = request.query_params['limit']
+        serializer = PantryQuerySerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        matches = pantry_index.search(
+            serializer.validated_data['products'],
+            serializer.validated_data['limit'],
         )
-        if not created:
+        recipes = Recipe.objects.only(
+            *RecipePreviewSerializer.Meta.fields
+        ).in_bulk([recipe_id for recipe_id, _, _ in matches])
+        results = []
+        for recipe_id, matched, count in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched = matched
+            recipe.missing = count - matched
+            recipe.coverage = round(matched / count, 4)
+            results.append(recipe)
+        return Response(PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        ).data)
+
+    def get_recipe_id(self):
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+
+    def add_recipe_to_collection(self, collection_model, recipe_id):
+        recipe = get_object_or_404(
+            Recipe.objects.only(*RecipePreviewSerializer.Meta.fields),
+            pk=recipe_id,
+        )
+        if not add_recipes_to_collection(
+            collection_model, self.request.user.id, [recipe.id]
+        ):
             raise ValidationError(
                 'Рецепт {recipe} уже добавлен в {collection}'.format(
-                    recipe=recipe,
+                    recipe=recipe.name,
                     collection=collection_model._meta.verbose_name_plural,
                 )
             )
@@ -198,25 +319,53 @@ class RecipeViewSet(
             status=status.HTTP_201_CREATED
         )
 
-    def delete_recipe_from_collection(self, collection_model, recipe):
-        get_object_or_404(
-            collection_model, user=self.request.user, recipe=recipe
-        ).delete()
+    def delete_recipe_from_collection(self, collection_model, recipe_id):
+        if not remove_recipes_from_collection(
+            collection_model, self.request.user.id, [recipe_id]
+        ):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def manage_recipe_collection(self, collection_model):
-        recipe = self.get_object()
+        recipe_id = self.get_recipe_id()
         if self.request.method == 'POST':
             return self.add_recipe_to_collection(
                 collection_model=collection_model,
-                recipe=recipe,
+                recipe_id=recipe_id,
             )
         if self.request.method == 'DELETE':
             return self.delete_recipe_from_collection(
                 collection_model=collection_model,
-                recipe=recipe,
+                recipe_id=recipe_id,
             )
 
+    def manage_recipes_collection(self, collection_model):
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        if self.request.method == 'POST':
+            changed_ids = add_recipes_to_collection(
+                collection_model, self.request.user.id, recipe_ids
+            )
+            changed_status, unchanged_status = 'added', 'already_added'
+        else:
+            changed_ids = remove_recipes_from_collection(
+                collection_model, self.request.user.id, recipe_ids
+            )
+            changed_status, unchanged_status = 'removed', 'not_in_collection'
+        changed_ids = set(changed_ids)
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    changed_status if recipe_id in changed_ids
+                    else unchanged_status if recipe_id in recipe_id_index
+                    else 'not_found'
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -235,28 +384,55 @@ class RecipeViewSet(
     def shopping_cart(self, request, *args, **kwargs):
         return self.manage_recipe_collection(ShoppingCart)
 
-    def get_combined_ingredients(self, user):
-        shopping_carts = (
-            ShoppingCart.objects
-            .filter(user=user)
-            .select_related('recipe', 'recipe__author')
-            .prefetch_related(
-                Prefetch(
-                    'recipe__ingredients',
-                    queryset=Ingredient.objects.select_related('product')
-                )
-            )
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorites(self, request, *args, **kwargs):
+        return self.manage_recipes_collection(Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST', 'DELETE'],
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_carts(self, request, *args, **kwargs):
+        return self.manage_recipes_collection(ShoppingCart)
+
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(
+            request,
+            force=force or self.action == 'download_shopping_cart',
         )
-        recipes_ids = shopping_carts.values_list('recipe', flat=True)
-        ingredients = Ingredient.objects.filter(
-            recipe__in=recipes_ids,
+
+    def get_combined_ingredients(self, user):
+        ingredients = ShoppingListItem.objects.filter(
+            user=user,
         ).values(
             product_name=F('product__name'),
             unit=F('product__measurement_unit'),
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('product__name')
-        return ingredients, Recipe.objects.filter(id__in=recipes_ids)
+            total=F('amount'),
+        )
+        recipes = Recipe.objects.filter(
+            shoppingcarts__user=user,
+        ).values('name', author_username=F('author__username'))
+        return ingredients.iterator(), recipes.iterator()
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list(self, request, *args, **kwargs):
+        return Response(ShoppingListItemSerializer(
+            ShoppingListItem.objects.filter(
+                user=request.user
+            ).select_related('product'),
+            many=True,
+        ).data)
 
     @action(
         detail=False,
@@ -264,13 +440,21 @@ class RecipeViewSet(
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request, *args, **kwargs):
-        return FileResponse(
-            generate_ingredients_file_content(
-                *self.get_combined_ingredients(
-                    user=self.request.user
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError(
+                'Поддерживаемые форматы списка покупок: {formats}'.format(
+                    formats=', '.join(SHOPPING_LIST_FORMATS)
                 )
-            ),
-            as_attachment=True,
-            filename='shopping_cart.txt',
-            content_type='text/plain; charset=utf-8',
+            )
+        generate_content, content_type = SHOPPING_LIST_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            generate_content(*self.get_combined_ingredients(
+                user=self.request.user
+            )),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
         )
+        return response
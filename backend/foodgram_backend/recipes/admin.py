@@ -3,6 +3,7 @@ from django.contrib.admin import (
 )
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Count
 from django.utils.safestring import mark_safe
 
 from .filters import (CookingTimeFilter, FollowersExistListFilter,
@@ -10,19 +11,26 @@ from .filters import (CookingTimeFilter, FollowersExistListFilter,
                       RecipesExistListFilter)
 from .models import (Favorite, Ingredient, Product, Recipe, ShoppingCart, Tag,
                      User)
+from .search import search_recipes
+from .shopping_lists import track_recipes_ingredients
 
 site.unregister(Group)
 
 
 class RecipeCountMixin:
 
-    @display(description='Рецептов')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_total=Count('recipes', distinct=True)
+        )
+
+    @display(description='Рецептов', ordering='recipes_total')
     def recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_total
 
 
 @register(User)
-class RecipeUserAdmin(RecipeCountMixin, UserAdmin):
+class RecipeUserAdmin(UserAdmin):
     list_display = (
         'id',
         'email',
@@ -34,9 +42,12 @@ class RecipeUserAdmin(RecipeCountMixin, UserAdmin):
         'follows_count',
     )
     fieldsets = (*UserAdmin.fieldsets, (None, {'fields': (
-        'avatar_image', 'avatar'
+        'avatar_image', 'avatar',
+        'recipes_count', 'followers_count', 'follows_count',
     )}))
-    readonly_fields = ('avatar_image',)
+    readonly_fields = (
+        'avatar_image', 'recipes_count', 'followers_count', 'follows_count',
+    )
     search_fields = ('email', 'first_name')
     list_filter = (
         RecipesExistListFilter,
@@ -66,18 +77,10 @@ class RecipeUserAdmin(RecipeCountMixin, UserAdmin):
     @mark_safe
     def avatar_image(self, user):
         return (
-            f'<img src="{user.avatar.url}" width="50" '
-            'height="50" style="object-fit: cover;" />'
+            f'<img src="{(user.avatar_thumbnail or user.avatar).url}" '
+            'width="50" height="50" style="object-fit: cover;" />'
         ) if user.avatar else ''
 
-    @display(description='Подписчиков')
-    def followers_count(self, author):
-        return author.authors.count()
-
-    @display(description='Подписок')
-    def follows_count(self, follower):
-        return follower.followers.count()
-
 
 @register(Tag)
 class TagAdmin(RecipeCountMixin, ModelAdmin):
@@ -98,6 +101,23 @@ class ProductAdmin(RecipeCountMixin, ModelAdmin):
 class IngredientAdmin(ModelAdmin):
     list_display = ('product', 'amount', 'recipe')
 
+    def save_model(self, request, obj, form, change):
+        recipe_ids = [obj.recipe_id]
+        if change:
+            recipe_ids.append(form.initial['recipe'])
+        with track_recipes_ingredients(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with track_recipes_ingredients([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with track_recipes_ingredients(
+            queryset.values_list('recipe_id', flat=True)
+        ):
+            super().delete_queryset(request, queryset)
+
 
 class IngredientInline(StackedInline):
     model = Ingredient
@@ -110,15 +130,20 @@ class RecipeAdmin(ModelAdmin):
         'id', 'name', 'author', 'cooking_time',
         'recipe_tags', 'ingredients', 'recipe_image',
     )
-    readonly_fields = ('favorited_count', )
+    readonly_fields = ('favorites_count', )
     search_fields = ('name', 'author__first_name', 'tags__name')
     list_filter = (CookingTimeFilter, 'tags', 'author')
     list_display_links = ('name', )
     inlines = [IngredientInline]
 
-    @display(description='В избранном')
-    def favorited_count(self, recipe):
-        return recipe.favorites.count()
+    def save_related(self, request, form, formsets, change):
+        with track_recipes_ingredients([form.instance.id]):
+            super().save_related(request, form, formsets, change)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
 
     @display(description='Продукты')
     @mark_safe
@@ -143,8 +168,8 @@ class RecipeAdmin(ModelAdmin):
     @mark_safe
     def recipe_image(self, recipe):
         return (
-            f'<img src="{recipe.image.url}" width="50" '
-            'height="50" style="object-fit: cover;" />'
+            f'<img src="{(recipe.image_thumbnail or recipe.image).url}" '
+            'width="50" height="50" style="object-fit: cover;" />'
         ) if recipe.image else ''
 
 
@@ -0,0 +1,48 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.BACKGROUND_WORKERS, 1),
+    thread_name_prefix='background',
+)
+pending = threading.local()
+
+
+def run_task(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась с ошибкой', func)
+    finally:
+        connections.close_all()
+
+
+def submit_task(func, *args):
+    if settings.BACKGROUND_WORKERS:
+        executor.submit(run_task, func, *args)
+    else:
+        func(*args)
+
+
+def run_in_background(func, *args):
+    transaction.on_commit(partial(submit_task, func, *args))
+
+
+def flush_batch(func):
+    ids = pending.__dict__.get('batches', {}).pop(func, None)
+    if ids:
+        submit_task(func, sorted(ids))
+
+
+def run_batch_in_background(func, ids):
+    if not hasattr(pending, 'batches'):
+        pending.batches = {}
+    pending.batches.setdefault(func, set()).update(ids)
+    transaction.on_commit(partial(flush_batch, func))
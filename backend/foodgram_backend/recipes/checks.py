@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] != LOCAL_CACHE_BACKEND:
+        return []
+    return [Warning(
+        'Кеш хранится в памяти процесса: версии данных, которые меняют '
+        'команды manage.py и другие воркеры, не дойдут до этого процесса, '
+        'и он будет отдавать устаревшие индексы и ответы до перезапуска.',
+        hint='Используйте CACHE_BACKEND=file.',
+        id='recipes.W001',
+    )]
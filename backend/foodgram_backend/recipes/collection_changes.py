@@ -0,0 +1,72 @@
+from functools import partial
+
+from django.db import connection, transaction
+
+from .counters import change_counter
+from .models import Favorite, Recipe, ShoppingCart
+from .shopping_lists import add_recipes_to_shopping_list
+from .versions import USER_VERSION, bump_version
+
+
+def apply_collection_changes(collection_model, user_id, recipe_ids, delta):
+    if not recipe_ids:
+        return
+    if collection_model is Favorite:
+        change_counter(Recipe, recipe_ids, 'favorites_count', delta)
+    if collection_model is ShoppingCart:
+        add_recipes_to_shopping_list(user_id, recipe_ids, sign=delta)
+    transaction.on_commit(partial(
+        bump_version, USER_VERSION.format(user_id=user_id)
+    ))
+
+
+def get_collection_columns(collection_model):
+    quote = connection.ops.quote_name
+    return (
+        quote(collection_model._meta.db_table),
+        quote(collection_model._meta.get_field('user').column),
+        quote(collection_model._meta.get_field('recipe').column),
+    )
+
+
+@transaction.atomic
+def add_recipes_to_collection(collection_model, user_id, recipe_ids):
+    if not recipe_ids:
+        return []
+    table, user_column, recipe_column = get_collection_columns(
+        collection_model
+    )
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_column}, {recipe_column}) '
+            f'SELECT %s, {quote(Recipe._meta.pk.column)} '
+            f'FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE {quote(Recipe._meta.pk.column)} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING RETURNING {recipe_column}',
+            [user_id, *recipe_ids],
+        )
+        added_ids = [recipe_id for recipe_id, in cursor.fetchall()]
+    apply_collection_changes(collection_model, user_id, added_ids, 1)
+    return added_ids
+
+
+@transaction.atomic
+def remove_recipes_from_collection(collection_model, user_id, recipe_ids):
+    if not recipe_ids:
+        return []
+    table, user_column, recipe_column = get_collection_columns(
+        collection_model
+    )
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {recipe_column} IN ({placeholders}) '
+            f'RETURNING {recipe_column}',
+            [user_id, *recipe_ids],
+        )
+        removed_ids = [recipe_id for recipe_id, in cursor.fetchall()]
+    apply_collection_changes(collection_model, user_id, removed_ids, -1)
+    return removed_ids
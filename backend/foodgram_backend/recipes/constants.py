@@ -1,2 +1,20 @@
 INGREDIENT_AMOUNT_MIN_VALUE = 1
 COOKING_TIME_MIN_VALUE = 1
+RECIPES_LIMIT_MAX = 50
+COLLECTION_BULK_MAX = 100
+RECIPE_THUMBNAIL_SIZE = (320, 320)
+RECIPE_DETAIL_SIZE = (1200, 1200)
+AVATAR_THUMBNAIL_SIZE = (50, 50)
+IMAGE_VARIANT_QUALITY = 82
+SHORT_LINK_LENGTH = 6
+SHORT_LINK_MULTIPLIER = 0x9E3779B1
+SHORT_LINK_MASK = 0x5BD1E995
+TIMELINE_PULL_RECIPES_MIN = 1000
+TIMELINE_BATCH_SIZE = 1000
+SHOPPING_LIST_BATCH_SIZE = 300
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_PRODUCT_RECIPES_MAX = 5000
+SIMILAR_BATCH_SIZE = 500
+PANTRY_PRODUCTS_MAX = 100
+PANTRY_RECIPES_LIMIT = 20
+PAGE_SIZE_MAX = 100
@@ -0,0 +1,42 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Follow, Recipe, User
+
+COUNTERS = {
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follow, 'author'),
+        'follows_count': (Follow, 'follower'),
+    },
+    Recipe: {
+        'favorites_count': (Favorite, 'recipe'),
+    },
+}
+
+
+def change_counter(model, ids, field_name, delta):
+    objects = model.objects.filter(id__in=ids)
+    if delta < 0:
+        objects = objects.filter(**{f'{field_name}__gte': -delta})
+    objects.update(**{field_name: F(field_name) + delta})
+
+
+def count_subquery(related_model, related_field):
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        Value(0),
+    )
+
+
+def rebuild_counters(model, ids):
+    model.objects.filter(id__in=ids).update(**{
+        field_name: count_subquery(*source)
+        for field_name, source in COUNTERS[model].items()
+    })
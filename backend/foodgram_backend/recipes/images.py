@@ -0,0 +1,105 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .constants import (AVATAR_THUMBNAIL_SIZE, IMAGE_VARIANT_QUALITY,
+                        RECIPE_DETAIL_SIZE, RECIPE_THUMBNAIL_SIZE)
+from .models import Recipe, User
+from .versions import DATA_VERSION, bump_version
+
+IMAGE_VARIANTS = {
+    Recipe: ('image', {
+        'image_thumbnail': RECIPE_THUMBNAIL_SIZE,
+        'image_detail': RECIPE_DETAIL_SIZE,
+    }),
+    User: ('avatar', {
+        'avatar_thumbnail': AVATAR_THUMBNAIL_SIZE,
+    }),
+}
+
+
+def get_variant_format():
+    if features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def render_variant(image, size):
+    image_format, extension = get_variant_format()
+    variant = ImageOps.exif_transpose(image)
+    variant.thumbnail(size, Image.LANCZOS)
+    if image_format == 'JPEG' or variant.mode not in ('RGB', 'RGBA'):
+        variant = variant.convert(
+            'RGBA' if image_format == 'WEBP' and 'A' in variant.getbands()
+            else 'RGB'
+        )
+    buffer = BytesIO()
+    variant.save(buffer, image_format, quality=IMAGE_VARIANT_QUALITY)
+    return ContentFile(buffer.getvalue()), extension
+
+
+def clear_image_variants(instance):
+    source_field, variants = IMAGE_VARIANTS[type(instance)]
+    source = getattr(instance, source_field)
+    if source and source._committed:
+        return None
+    stale_names = [
+        getattr(instance, field_name).name for field_name in variants
+        if getattr(instance, field_name)
+    ]
+    for field_name in variants:
+        setattr(instance, field_name, '')
+    return stale_names
+
+
+def get_replaced_source(instance, update_fields=None):
+    source_field, _ = IMAGE_VARIANTS[type(instance)]
+    source = getattr(instance, source_field)
+    if (
+        instance._state.adding
+        or source and source._committed
+        or update_fields is not None and source_field not in update_fields
+    ):
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(
+        source_field, flat=True
+    ).first()
+
+
+def delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def generate_image_variants(model, pk, stale_names=()):
+    source_field, variants = IMAGE_VARIANTS[model]
+    storage = model._meta.get_field(source_field).storage
+    delete_files(storage, stale_names)
+    instance = model.objects.filter(pk=pk).only(
+        source_field, *variants
+    ).first()
+    if instance is None or not getattr(instance, source_field):
+        return
+    source = getattr(instance, source_field)
+    stem = os.path.splitext(os.path.basename(source.name))[0]
+    names = {}
+    with source.open('rb'), Image.open(source) as image:
+        for field_name, size in variants.items():
+            content, extension = render_variant(image, size)
+            field = model._meta.get_field(field_name)
+            names[field_name] = field.storage.save(
+                field.generate_filename(instance, f'{stem}.{extension}'),
+                content,
+            )
+    if not model.objects.filter(
+        pk=pk, **{source_field: source.name}
+    ).update(**names):
+        delete_files(storage, names.values())
+        return
+    delete_files(storage, [
+        getattr(instance, field_name).name for field_name in variants
+        if getattr(instance, field_name)
+    ])
+    bump_version(DATA_VERSION)
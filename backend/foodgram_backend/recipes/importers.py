@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+from itertools import chain
+
+from django.db import connection
+
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = ' \t\r\n,'
+
+
+def read_json(file, fields):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+            position += 1
+        if position < len(buffer) and not started:
+            if buffer[position] != '[':
+                raise ValueError('Файл JSON должен содержать список объектов')
+            started = True
+            position += 1
+            continue
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                continue
+        if eof:
+            raise ValueError('Файл JSON оборвался до конца списка')
+        chunk = file.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def read_jsonl(file, fields):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file, fields):
+    rows = csv.reader(file)
+    first_row = next(rows, None)
+    if first_row is None:
+        return
+    if set(first_row) == set(fields):
+        columns = first_row
+    else:
+        columns = fields
+        rows = chain([first_row], rows)
+    for row in rows:
+        if row:
+            yield dict(zip(columns, row))
+
+
+READERS = {
+    'json': read_json,
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+def get_key(item, key_fields):
+    return tuple(item[field] for field in key_fields)
+
+
+def upsert_objects(model, items, key_fields, update_fields):
+    items_by_key = {get_key(item, key_fields): item for item in items}
+    existing = {
+        get_key(vars(instance), key_fields): instance
+        for instance in model.objects.filter(**{
+            f'{key_fields[0]}__in': {key[0] for key in items_by_key}
+        })
+    }
+    new_objects = []
+    changed_objects = []
+    for key, item in items_by_key.items():
+        instance = existing.get(key)
+        if instance is None:
+            new_objects.append(model(**item))
+            continue
+        if any(getattr(instance, field) != item[field]
+               for field in update_fields):
+            for field in update_fields:
+                setattr(instance, field, item[field])
+            changed_objects.append(instance)
+    model.objects.bulk_create(new_objects)
+    if changed_objects:
+        model.objects.bulk_update(changed_objects, update_fields)
+    return (
+        len(new_objects),
+        len(changed_objects),
+        len(items) - len(new_objects) - len(changed_objects),
+    )
+
+
+def copy_upsert_objects(model, batches, fields, key_fields, update_fields):
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(
+        quote(model._meta.get_field(field).column) for field in fields
+    )
+    keys = ', '.join(
+        quote(model._meta.get_field(field).column) for field in key_fields
+    )
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE import_rows ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        for items in batches:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for item in items:
+                writer.writerow([item[field] for field in fields])
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY import_rows ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            total += len(items)
+        if update_fields:
+            updates = [
+                quote(model._meta.get_field(field).column)
+                for field in update_fields
+            ]
+            conflict = (
+                'DO UPDATE SET '
+                + ', '.join(f'{column} = EXCLUDED.{column}'
+                            for column in updates)
+                + ' WHERE ('
+                + ', '.join(f'{table}.{column}' for column in updates)
+                + ') IS DISTINCT FROM ('
+                + ', '.join(f'EXCLUDED.{column}' for column in updates)
+                + ')'
+            )
+        else:
+            conflict = 'DO NOTHING'
+        cursor.execute(
+            f'WITH upserted AS (INSERT INTO {table} ({columns}) '
+            f'SELECT DISTINCT ON ({keys}) {columns} FROM import_rows '
+            f'ORDER BY {keys} '
+            f'ON CONFLICT ({keys}) {conflict} '
+            'RETURNING xmax = 0 AS inserted) '
+            'SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FROM upserted'
+        )
+        created, upserted = cursor.fetchone()
+    updated = upserted - created
+    return created, updated, total - created - updated
@@ -0,0 +1,216 @@
+import bisect
+import gzip
+import hashlib
+import json
+import threading
+from collections import defaultdict
+
+from .background import submit_task
+from .models import Ingredient, Product, Recipe
+from .versions import (CATALOG_VERSION, RECIPE_IDS_VERSION,
+                       RECIPE_PRODUCTS_VERSION, get_version)
+
+
+class VersionedIndex:
+    version_name = None
+
+    def __init__(self):
+        self.version = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        version = get_version(self.version_name)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build()
+                self.version = version
+
+
+class ProductPrefixIndex(VersionedIndex):
+    version_name = CATALOG_VERSION
+
+    def build(self):
+        products = sorted(
+            (name.lower(), name, product_id, measurement_unit)
+            for product_id, name, measurement_unit
+            in Product.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self.entries = (
+            [key for key, *_ in products],
+            [
+                {
+                    'id': product_id,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                }
+                for _, name, product_id, measurement_unit in products
+            ],
+        )
+
+    def search(self, prefix, limit=None):
+        self.refresh()
+        keys, products = self.entries
+        prefix = prefix.lower()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + chr(0x10FFFF), lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return products[start:end]
+
+
+product_index = ProductPrefixIndex()
+
+
+class CatalogSnapshot(VersionedIndex):
+    version_name = CATALOG_VERSION
+
+    def build(self):
+        product_index.refresh()
+        _, products = product_index.entries
+        content = json.dumps(products, ensure_ascii=False).encode()
+        self.entries = (
+            hashlib.md5(content).hexdigest(),
+            content,
+            gzip.compress(content, mtime=0),
+        )
+
+    def get(self):
+        self.refresh()
+        return self.entries
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+class RecipeIdIndex(VersionedIndex):
+    version_name = RECIPE_IDS_VERSION
+
+    def build(self):
+        recipe_ids = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        )
+        max_id = recipe_ids.first()
+        bits = bytearray(max_id // 8 + 1 if max_id is not None else 0)
+        for recipe_id in recipe_ids.iterator():
+            bits[recipe_id // 8] |= 1 << recipe_id % 8
+        self.entries = bytes(bits)
+
+    def __contains__(self, recipe_id):
+        self.refresh()
+        return (
+            0 <= recipe_id < len(self.entries) * 8
+            and bool(self.entries[recipe_id // 8] & 1 << recipe_id % 8)
+        )
+
+
+recipe_id_index = RecipeIdIndex()
+
+
+def make_bitset(positions, size):
+    bits = bytearray(size)
+    for position in positions:
+        bits[position // 8] |= 1 << position % 8
+    return int.from_bytes(bits, 'little')
+
+
+def iter_bitset(bits):
+    while bits:
+        position = bits.bit_length() - 1
+        yield position
+        bits ^= 1 << position
+
+
+class PantryIndex(VersionedIndex):
+    version_name = RECIPE_PRODUCTS_VERSION
+
+    def refresh(self):
+        if self.version is None:
+            return super().refresh()
+        version = get_version(self.version_name)
+        if version != self.version and self.lock.acquire(blocking=False):
+            submit_task(self.rebuild, version)
+
+    def rebuild(self, version):
+        try:
+            self.build()
+            self.version = version
+        finally:
+            self.lock.release()
+
+    def build(self):
+        recipe_products = defaultdict(set)
+        for recipe_id, product_id in Ingredient.objects.values_list(
+            'recipe_id', 'product_id'
+        ).order_by().iterator():
+            recipe_products[recipe_id].add(product_id)
+        size = max(recipe_products, default=0) // 8 + 1
+        product_recipes = defaultdict(list)
+        recipes_by_count = defaultdict(list)
+        for recipe_id, product_ids in recipe_products.items():
+            recipes_by_count[len(product_ids)].append(recipe_id)
+            for product_id in product_ids:
+                product_recipes[product_id].append(recipe_id)
+        self.entries = (
+            {
+                product_id: make_bitset(recipe_ids, size)
+                for product_id, recipe_ids in product_recipes.items()
+            },
+            {
+                count: make_bitset(recipe_ids, size)
+                for count, recipe_ids in recipes_by_count.items()
+            },
+        )
+
+    def count_matches(self, product_ids):
+        product_recipes, _ = self.entries
+        planes = []
+        for product_id in set(product_ids):
+            carry = product_recipes.get(product_id, 0)
+            for index, plane in enumerate(planes):
+                if not carry:
+                    break
+                planes[index], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        return planes
+
+    def search(self, product_ids, limit):
+        self.refresh()
+        _, recipes_by_count = self.entries
+        planes = self.count_matches(product_ids)
+        matched = 0
+        for plane in planes:
+            matched |= plane
+        max_matched = (1 << len(planes)) - 1
+        groups = []
+        for count, recipes in recipes_by_count.items():
+            candidates = recipes & matched
+            for matched_count in range(min(count, max_matched), 0, -1):
+                if not candidates:
+                    break
+                bits = candidates
+                for index, plane in enumerate(planes):
+                    bits &= plane if matched_count >> index & 1 else ~plane
+                if bits:
+                    groups.append((matched_count, count, bits))
+                    candidates &= ~bits
+        groups.sort(key=lambda group: (
+            -group[0] / group[1], group[1] - group[0]
+        ))
+        results = []
+        for matched_count, count, bits in groups:
+            for recipe_id in iter_bitset(bits):
+                if len(results) == limit:
+                    return results
+                results.append((recipe_id, matched_count, count))
+        return results
+
+
+pantry_index = PantryIndex()
@@ -1,40 +1,114 @@
-import json
 import os
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
 from django.db.models import Model
 
+from recipes.importers import READERS, copy_upsert_objects, upsert_objects
+from recipes.versions import DATA_VERSION, bump_version
+
 
 class Command(BaseCommand):
     model: Model = None
+    fields = ()
+    key_fields = ()
+    update_fields = ()
+    versions = (DATA_VERSION,)
 
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
             type=str,
-            help='Путь от директории проекта до json файла с '
+            help='Путь от директории проекта до json, jsonl или csv файла с '
                  f'{self.model._meta.verbose_name_plural}',
         )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество записей, сохраняемых в одной транзакции',
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загрузить записи через COPY (только PostgreSQL)',
+        )
+
+    def get_batches(self, items, batch_size):
+        items = iter(items)
+        while True:
+            batch = [
+                {field: item[field] for field in self.fields}
+                for item in islice(items, batch_size)
+            ]
+            if not batch:
+                return
+            yield batch
+
+    def import_objects(self, batches, use_copy):
+        if use_copy:
+            with transaction.atomic():
+                return copy_upsert_objects(
+                    self.model, batches, self.fields,
+                    self.key_fields, self.update_fields,
+                )
+        counts = [0, 0, 0]
+        for batch in batches:
+            with transaction.atomic():
+                batch_counts = upsert_objects(
+                    self.model, batch, self.key_fields, self.update_fields
+                )
+            counts = [
+                total + count for total, count in zip(counts, batch_counts)
+            ]
+        return counts
 
     def handle(self, *args, **kwargs):
+        file_path = kwargs['file_path']
+        full_file_path = os.path.join(settings.BASE_DIR, file_path)
+        file_format = (
+            kwargs['format']
+            or os.path.splitext(file_path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла {file_path}, '
+                'укажите --format'
+            )
+        if kwargs['copy'] and connection.vendor != 'postgresql':
+            raise CommandError(
+                'Загрузка через COPY доступна только в PostgreSQL'
+            )
+        if kwargs['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
         try:
-            file_path = kwargs['file_path']
-            full_file_path = os.path.join(settings.BASE_DIR, file_path)
-            with open(full_file_path, 'r', encoding='utf-8') as file:
-                created_objects_count = len(
-                    self.model.objects.bulk_create(
-                        (self.model(**item) for item in json.load(file)),
-                        ignore_conflicts=True,
-                    )
+            with open(full_file_path, 'r', encoding='utf-8',
+                      newline='') as file:
+                created, updated, skipped = self.import_objects(
+                    self.get_batches(
+                        READERS[file_format](file, self.fields),
+                        kwargs['batch_size'],
+                    ),
+                    kwargs['copy'],
                 )
-            self.stdout.write(
-                f'Успешно загружено {created_objects_count} '
-                f'{self.model._meta.verbose_name_plural}'
-            )
-        except Exception as exception:
-            self.stdout.write(
+        except (OSError, ValueError, KeyError, TypeError,
+                DatabaseError) as exception:
+            raise CommandError(
                 f'Во время импорта {self.model._meta.verbose_name_plural} '
                 f'из файла {file_path} '
-                f'произошла ошибка: {exception}'
-            )
+                f'произошла ошибка: {exception!r}'
+            ) from exception
+        finally:
+            for version in self.versions:
+                bump_version(version)
+        self.stdout.write(
+            f'Импорт {self.model._meta.verbose_name_plural} завершен: '
+            f'создано {created}, обновлено {updated}, пропущено {skipped}'
+        )
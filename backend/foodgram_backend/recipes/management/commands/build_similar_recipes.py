@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import rebuild_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты по общим продуктам'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_similar_recipes()
+        self.stdout.write(f'Похожие рецепты пересчитаны для {count} рецептов')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.images import IMAGE_VARIANTS, generate_image_variants
+
+
+class Command(BaseCommand):
+    help = 'Создает миниатюры изображений рецептов и аватар'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать миниатюры и для объектов, у которых они есть',
+        )
+
+    def handle(self, *args, **kwargs):
+        for model, (source_field, variants) in IMAGE_VARIANTS.items():
+            objects = model.objects.exclude(**{source_field: ''}).exclude(
+                **{f'{source_field}__isnull': True}
+            )
+            if not kwargs['all']:
+                missing = Q()
+                for field_name in variants:
+                    missing |= Q(**{field_name: ''})
+                objects = objects.filter(missing)
+            generated_count = 0
+            for pk in objects.order_by('pk').values_list('pk', flat=True):
+                generate_image_variants(model, pk)
+                generated_count += 1
+            self.stdout.write(
+                f'Созданы миниатюры: {generated_count} '
+                f'{model._meta.verbose_name_plural}'
+            )
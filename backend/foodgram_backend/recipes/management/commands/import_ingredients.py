@@ -1,7 +1,11 @@
 from recipes.models import Product
+from recipes.versions import CATALOG_VERSION, DATA_VERSION
 
 from .base_command import Command
 
 
 class Command(Command):
     model = Product
+    fields = ('name', 'measurement_unit')
+    key_fields = ('name', 'measurement_unit')
+    versions = (DATA_VERSION, CATALOG_VERSION)
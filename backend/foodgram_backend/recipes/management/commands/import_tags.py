@@ -5,3 +5,6 @@ from .base_command import Command
 
 class Command(Command):
     model = Tag
+    fields = ('name', 'slug')
+    key_fields = ('slug',)
+    update_fields = ('name',)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики рецептов, подписок и избранного'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество объектов, пересчитываемых за один запрос',
+        )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        for model in COUNTERS:
+            ids = model.objects.order_by('id').values_list('id', flat=True)
+            last_id = 0
+            rebuilt_count = 0
+            while True:
+                batch = list(ids.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                rebuild_counters(model, batch)
+                rebuilt_count += len(batch)
+                last_id = batch[-1]
+            self.stdout.write(
+                f'Пересчитаны счетчики: {rebuilt_count} '
+                f'{model._meta.verbose_name_plural}'
+            )
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_detail',
+            field=models.ImageField(blank=True, default='', editable=False, upload_to='recipes/image/detail', verbose_name='Изображение для страницы рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, default='', editable=False, upload_to='recipes/image/thumbnails', verbose_name='Миниатюра изображения'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnail',
+            field=models.ImageField(blank=True, default='', editable=False, upload_to='user/avatar/thumbnails', verbose_name='Миниатюра аватары'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'recipes_recipe_search'
+
+INGREDIENTS_SQL = (
+    'SELECT {aggregate} FROM recipes_ingredient '
+    'JOIN recipes_product ON recipes_product.id = '
+    'recipes_ingredient.product_id '
+    'WHERE recipes_ingredient.recipe_id = recipes_recipe.id'
+)
+TAGS_SQL = (
+    'SELECT {aggregate} FROM recipes_recipe_tags '
+    'JOIN recipes_tag ON recipes_tag.id = recipes_recipe_tags.tag_id '
+    'WHERE recipes_recipe_tags.recipe_id = recipes_recipe.id'
+)
+
+
+def postgres_vector(value, weight):
+    return (
+        "setweight(to_tsvector('russian', "
+        f"coalesce(({value}), '')), '{weight}')"
+    )
+
+
+POSTGRES_AGGREGATE = "string_agg({}.name, ' ')"
+SQLITE_AGGREGATE = "group_concat({}.name, ' ')"
+
+SEARCH_INDEX_SQL = {
+    'postgresql': [
+        f'CREATE TABLE {SEARCH_TABLE} ('
+        'recipe_id bigint PRIMARY KEY '
+        'REFERENCES recipes_recipe (id) ON DELETE CASCADE, '
+        'document tsvector NOT NULL)',
+        f'CREATE INDEX {SEARCH_TABLE}_document_index '
+        f'ON {SEARCH_TABLE} USING GIN (document)',
+        f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) '
+        'SELECT recipes_recipe.id, '
+        + ' || '.join([
+            postgres_vector('recipes_recipe.name', 'A'),
+            postgres_vector(INGREDIENTS_SQL.format(
+                aggregate=POSTGRES_AGGREGATE.format('recipes_product')
+            ), 'B'),
+            postgres_vector(TAGS_SQL.format(
+                aggregate=POSTGRES_AGGREGATE.format('recipes_tag')
+            ), 'B'),
+            postgres_vector(
+                "concat_ws(' ', recipes_user.first_name, "
+                'recipes_user.last_name, recipes_user.username)',
+                'C',
+            ),
+            postgres_vector('recipes_recipe.text', 'D'),
+        ])
+        + ' FROM recipes_recipe JOIN recipes_user '
+        'ON recipes_user.id = recipes_recipe.author_id',
+    ],
+    'sqlite': [
+        f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+        'name, ingredients, tags, author, text, '
+        "tokenize = 'unicode61 remove_diacritics 2')",
+        f'INSERT INTO {SEARCH_TABLE} '
+        '(rowid, name, ingredients, tags, author, text) '
+        'SELECT recipes_recipe.id, recipes_recipe.name, '
+        "coalesce(({}), ''), coalesce(({}), ''), ".format(
+            INGREDIENTS_SQL.format(
+                aggregate=SQLITE_AGGREGATE.format('recipes_product')
+            ),
+            TAGS_SQL.format(
+                aggregate=SQLITE_AGGREGATE.format('recipes_tag')
+            ),
+        )
+        + "recipes_user.first_name || ' ' || recipes_user.last_name "
+        "|| ' ' || recipes_user.username, recipes_recipe.text "
+        'FROM recipes_recipe JOIN recipes_user '
+        'ON recipes_user.id = recipes_recipe.author_id',
+    ],
+}
+
+
+def create_search_index(apps, schema_editor):
+    for sql in SEARCH_INDEX_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in SEARCH_INDEX_SQL:
+        schema_editor.execute(f'DROP TABLE {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
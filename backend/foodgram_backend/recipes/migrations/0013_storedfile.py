@@ -0,0 +1,48 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:43
+
+from collections import Counter
+
+from django.db import migrations, models
+
+FILE_FIELDS = {
+    'Recipe': ('image', 'image_thumbnail', 'image_detail'),
+    'User': ('avatar', 'avatar_thumbnail'),
+}
+
+
+def fill_stored_files(apps, schema_editor):
+    StoredFile = apps.get_model('recipes', 'StoredFile')
+    references = Counter()
+    for model_name, field_names in FILE_FIELDS.items():
+        model = apps.get_model('recipes', model_name)
+        for names in model.objects.values_list(*field_names).iterator():
+            references.update(name for name in names if name)
+    StoredFile.objects.bulk_create(
+        (
+            StoredFile(name=name, references=count)
+            for name, count in references.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+        migrations.RunPython(fill_stored_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_push_state(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    Recipe.objects.filter(
+        author__recipes_count__lt=1000
+    ).update(pushed_to_timelines=True)
+    TimelineEntry.objects.update(author_id=Subquery(
+        Recipe.objects.filter(
+            pk=OuterRef('recipe_id')
+        ).values('author_id')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='pushed_to_timelines',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Разослан в ленты подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='author',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.RunPython(fill_push_state, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('pushed_to_timelines', False)), fields=['author', '-pub_date', '-id'], name='recipe_not_pushed_index'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_index'),
+        ),
+    ]
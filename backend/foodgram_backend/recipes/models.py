@@ -6,7 +6,20 @@ from django.db import models
 from .constants import COOKING_TIME_MIN_VALUE, INGREDIENT_AMOUNT_MIN_VALUE
 
 
-class User(AbstractUser):
+class WriteProtectedFieldsMixin:
+    write_protected_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.write_protected_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(WriteProtectedFieldsMixin, AbstractUser):
 
     username = models.CharField(
         verbose_name='Никнейм',
@@ -26,6 +39,13 @@ class User(AbstractUser):
         null=True,
         default=None,
     )
+    avatar_thumbnail = models.ImageField(
+        verbose_name='Миниатюра аватары',
+        upload_to='user/avatar/thumbnails',
+        blank=True,
+        default='',
+        editable=False,
+    )
     first_name = models.CharField(
         verbose_name='Имя',
         max_length=150,
@@ -34,7 +54,25 @@ class User(AbstractUser):
         verbose_name='Фамилия',
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
+    follows_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0,
+        editable=False,
+    )
 
+    write_protected_fields = (
+        'recipes_count', 'followers_count', 'follows_count',
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -45,6 +83,12 @@ class User(AbstractUser):
         ordering = ('username',)
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            models.Index(
+                fields=['username', 'id'],
+                name='user_username_id_index',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -136,7 +180,7 @@ class Ingredient(models.Model):
         ordering = ('product__name',)
 
 
-class Recipe(models.Model):
+class Recipe(WriteProtectedFieldsMixin, models.Model):
     name = models.CharField(
         max_length=256,
         verbose_name='Название',
@@ -150,6 +194,20 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         default='',
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/image/thumbnails',
+        verbose_name='Миниатюра изображения',
+        blank=True,
+        default='',
+        editable=False,
+    )
+    image_detail = models.ImageField(
+        upload_to='recipes/image/detail',
+        verbose_name='Изображение для страницы рецепта',
+        blank=True,
+        default='',
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -172,6 +230,18 @@ class Recipe(models.Model):
         verbose_name='Дата создания',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    pushed_to_timelines = models.BooleanField(
+        verbose_name='Разослан в ленты подписчиков',
+        default=False,
+        editable=False,
+    )
+
+    write_protected_fields = ('favorites_count', 'pushed_to_timelines')
 
     def __str__(self):
         return f'Название: {self.name}, Ник автора: {self.author.username}'
@@ -181,6 +251,17 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_index',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_not_pushed_index',
+                condition=models.Q(pushed_to_timelines=False),
+            ),
+        ]
 
 
 class CollectionBaseModel(models.Model):
@@ -225,3 +306,132 @@ class ShoppingCart(CollectionBaseModel):
     class Meta(CollectionBaseModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт',
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+    )
+
+    def __str__(self):
+        return f'{self.product} - {self.amount}'
+
+    class Meta:
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+        default_related_name = 'shopping_list_items'
+        ordering = ('product__name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product'],
+                name='shopping_list_item_unique_constraint'
+            )
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата создания рецепта',
+    )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте пользователя {self.user}'
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        default_related_name = 'timeline_entries'
+        ordering = ('-pub_date', '-recipe_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='timeline_entry_unique_constraint'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_index',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_index',
+            ),
+        ]
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('-score', 'similar_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='similar_recipe_unique_constraint'
+            )
+        ]
+
+
+class StoredFile(models.Model):
+    name = models.CharField(
+        verbose_name='Имя файла',
+        max_length=255,
+        primary_key=True,
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Ссылок',
+        default=0,
+    )
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
@@ -0,0 +1,187 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .background import run_batch_in_background
+
+SEARCH_TABLE = 'recipes_recipe_search'
+SEARCH_CONFIG = 'russian'
+SEARCH_BATCH_SIZE = 500
+
+INGREDIENTS_SQL = (
+    'SELECT {aggregate} FROM recipes_ingredient '
+    'JOIN recipes_product ON recipes_product.id = '
+    'recipes_ingredient.product_id '
+    'WHERE recipes_ingredient.recipe_id = recipes_recipe.id'
+)
+TAGS_SQL = (
+    'SELECT {aggregate} FROM recipes_recipe_tags '
+    'JOIN recipes_tag ON recipes_tag.id = recipes_recipe_tags.tag_id '
+    'WHERE recipes_recipe_tags.recipe_id = recipes_recipe.id'
+)
+
+
+class PostgresSearchIndex:
+    key_column = 'recipe_id'
+
+    def get_create_sql(self):
+        return [
+            f'CREATE TABLE {SEARCH_TABLE} ('
+            'recipe_id bigint PRIMARY KEY '
+            'REFERENCES recipes_recipe (id) ON DELETE CASCADE, '
+            'document tsvector NOT NULL)',
+            f'CREATE INDEX {SEARCH_TABLE}_document_index '
+            f'ON {SEARCH_TABLE} USING GIN (document)',
+        ]
+
+    def get_fill_sql(self, where):
+        def vector(value, weight):
+            return (
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+                f"coalesce(({value}), '')), '{weight}')"
+            )
+        aggregate = "string_agg({}.name, ' ')"
+        return (
+            f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) '
+            'SELECT recipes_recipe.id, '
+            + ' || '.join([
+                vector('recipes_recipe.name', 'A'),
+                vector(INGREDIENTS_SQL.format(
+                    aggregate=aggregate.format('recipes_product')
+                ), 'B'),
+                vector(TAGS_SQL.format(
+                    aggregate=aggregate.format('recipes_tag')
+                ), 'B'),
+                vector(
+                    "concat_ws(' ', recipes_user.first_name, "
+                    'recipes_user.last_name, recipes_user.username)',
+                    'C',
+                ),
+                vector('recipes_recipe.text', 'D'),
+            ])
+            + ' FROM recipes_recipe JOIN recipes_user '
+            'ON recipes_user.id = recipes_recipe.author_id'
+            + where
+        )
+
+    def get_query(self, search):
+        return search
+
+    def get_match_sql(self):
+        return (
+            f'SELECT recipe_id FROM {SEARCH_TABLE} WHERE document @@ '
+            f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        )
+
+    def get_rank_sql(self):
+        return (
+            f'SELECT ts_rank_cd(document, '
+            f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)) "
+            f'FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE}.recipe_id = recipes_recipe.id'
+        )
+
+
+class SqliteSearchIndex:
+    key_column = 'rowid'
+
+    def get_create_sql(self):
+        return [
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+            'name, ingredients, tags, author, text, '
+            "tokenize = 'unicode61 remove_diacritics 2')",
+        ]
+
+    def get_fill_sql(self, where):
+        aggregate = "group_concat({}.name, ' ')"
+        return (
+            f'INSERT INTO {SEARCH_TABLE} '
+            '(rowid, name, ingredients, tags, author, text) '
+            'SELECT recipes_recipe.id, recipes_recipe.name, '
+            "coalesce(({}), ''), coalesce(({}), ''), ".format(
+                INGREDIENTS_SQL.format(
+                    aggregate=aggregate.format('recipes_product')
+                ),
+                TAGS_SQL.format(aggregate=aggregate.format('recipes_tag')),
+            )
+            + "recipes_user.first_name || ' ' || recipes_user.last_name "
+            "|| ' ' || recipes_user.username, recipes_recipe.text "
+            'FROM recipes_recipe JOIN recipes_user '
+            'ON recipes_user.id = recipes_recipe.author_id'
+            + where
+        )
+
+    def get_query(self, search):
+        return ' '.join(
+            '"{}"*'.format(word)
+            for word in re.findall(r'\w+', search.lower())
+        )
+
+    def get_match_sql(self):
+        return (
+            f'SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s'
+        )
+
+    def get_rank_sql(self):
+        return (
+            f'SELECT -bm25({SEARCH_TABLE}, 10.0, 4.0, 4.0, 2.0, 1.0) '
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            f'AND {SEARCH_TABLE}.rowid = recipes_recipe.id'
+        )
+
+
+SEARCH_INDEXES = {
+    'postgresql': PostgresSearchIndex,
+    'sqlite': SqliteSearchIndex,
+}
+
+
+def get_search_index(vendor=None):
+    search_index = SEARCH_INDEXES.get(vendor or connection.vendor)
+    return search_index() if search_index else None
+
+
+def update_search_index(recipe_ids=None):
+    search_index = get_search_index()
+    if search_index is None:
+        return
+    recipe_ids = list(recipe_ids) if recipe_ids is not None else None
+    with transaction.atomic(), connection.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(search_index.get_fill_sql(''))
+            return
+        for start in range(0, len(recipe_ids), SEARCH_BATCH_SIZE):
+            batch = recipe_ids[start:start + SEARCH_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} '
+                f'WHERE {search_index.key_column} IN ({placeholders})',
+                batch,
+            )
+            cursor.execute(
+                search_index.get_fill_sql(
+                    f' WHERE recipes_recipe.id IN ({placeholders})'
+                ),
+                batch,
+            )
+
+
+def schedule_search_update(recipe_ids):
+    run_batch_in_background(update_search_index, recipe_ids)
+
+
+def search_recipes(recipes, search):
+    search_index = get_search_index()
+    if search_index is None:
+        return recipes.filter(name__icontains=search)
+    query = search_index.get_query(search)
+    if not query:
+        return recipes.none()
+    return recipes.filter(
+        id__in=RawSQL(search_index.get_match_sql(), (query,))
+    ).annotate(
+        search_rank=RawSQL(search_index.get_rank_sql(), (query,))
+    ).order_by('-search_rank', '-pub_date', '-id')
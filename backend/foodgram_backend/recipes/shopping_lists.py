@@ -0,0 +1,92 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connection
+from django.db.models import Sum
+
+from .constants import SHOPPING_LIST_BATCH_SIZE
+from .models import Ingredient, ShoppingCart, ShoppingListItem
+
+
+def get_recipes_amounts(recipe_ids):
+    amounts = defaultdict(Counter)
+    for recipe_id, product_id, amount in Ingredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('recipe_id', 'product_id').annotate(
+        total=Sum('amount')
+    ).values_list('recipe_id', 'product_id', 'total').order_by():
+        amounts[recipe_id][product_id] = amount
+    return amounts
+
+
+def upsert_shopping_list_items(rows):
+    quote = connection.ops.quote_name
+    table = quote(ShoppingListItem._meta.db_table)
+    user, product, amount = (
+        quote(ShoppingListItem._meta.get_field(name).column)
+        for name in ('user', 'product', 'amount')
+    )
+    placeholders = ', '.join(['(%s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user}, {product}, {amount}) '
+            f'VALUES {placeholders} '
+            f'ON CONFLICT ({user}, {product}) DO UPDATE '
+            f'SET {amount} = {table}.{amount} + EXCLUDED.{amount}',
+            [value for row in rows for value in row],
+        )
+
+
+def change_shopping_lists(user_ids, amounts):
+    amounts = {
+        product_id: amount
+        for product_id, amount in amounts.items()
+        if amount
+    }
+    if not user_ids or not amounts:
+        return
+    rows = (
+        (user_id, product_id, amount)
+        for user_id in user_ids
+        for product_id, amount in amounts.items()
+    )
+    while True:
+        batch = list(islice(rows, SHOPPING_LIST_BATCH_SIZE))
+        if not batch:
+            break
+        upsert_shopping_list_items(batch)
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids,
+        amount__lte=0,
+    ).delete()
+
+
+def add_recipes_to_shopping_list(user_id, recipe_ids, sign=1):
+    total = Counter()
+    for amounts in get_recipes_amounts(recipe_ids).values():
+        total.update(amounts)
+    change_shopping_lists([user_id], {
+        product_id: sign * amount for product_id, amount in total.items()
+    })
+
+
+def remove_recipes_from_shopping_list(user_id, recipe_ids):
+    add_recipes_to_shopping_list(user_id, recipe_ids, sign=-1)
+
+
+@contextmanager
+def track_recipes_ingredients(recipe_ids):
+    recipe_ids = set(recipe_ids)
+    old_amounts = get_recipes_amounts(recipe_ids)
+    yield
+    new_amounts = get_recipes_amounts(recipe_ids)
+    users_by_recipe = defaultdict(list)
+    for recipe_id, user_id in ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'user_id'):
+        users_by_recipe[recipe_id].append(user_id)
+    for recipe_id, user_ids in users_by_recipe.items():
+        delta = Counter(new_amounts[recipe_id])
+        delta.subtract(old_amounts[recipe_id])
+        change_shopping_lists(user_ids, delta)
@@ -0,0 +1,31 @@
+import string
+
+from .constants import (SHORT_LINK_LENGTH, SHORT_LINK_MASK,
+                        SHORT_LINK_MULTIPLIER)
+
+ALPHABET = string.ascii_letters + string.digits
+ID_MODULUS = 2 ** 32
+SHORT_LINK_INVERSE = pow(SHORT_LINK_MULTIPLIER, -1, ID_MODULUS)
+
+
+def encode_recipe_id(recipe_id):
+    number = (recipe_id * SHORT_LINK_MULTIPLIER % ID_MODULUS) ^ SHORT_LINK_MASK
+    code = []
+    for _ in range(SHORT_LINK_LENGTH):
+        number, digit = divmod(number, len(ALPHABET))
+        code.append(ALPHABET[digit])
+    return ''.join(reversed(code))
+
+
+def decode_short_code(code):
+    if len(code) != SHORT_LINK_LENGTH:
+        return None
+    number = 0
+    for char in code:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        number = number * len(ALPHABET) + digit
+    if number >= ID_MODULUS:
+        return None
+    return (number ^ SHORT_LINK_MASK) * SHORT_LINK_INVERSE % ID_MODULUS
@@ -0,0 +1,231 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .background import run_batch_in_background, run_in_background
+from .collection_changes import apply_collection_changes
+from .counters import change_counter
+from .images import (IMAGE_VARIANTS, clear_image_variants, delete_files,
+                     generate_image_variants, get_replaced_source)
+from .models import (Favorite, Follow, Ingredient, Product, Recipe,
+                     ShoppingCart, Tag, User)
+from .search import schedule_search_update
+from .similarity import update_similar_recipes
+from .timelines import (push_author_to_timeline, push_recipe_to_timelines,
+                        remove_author_from_timeline)
+from .versions import (CATALOG_VERSION, DATA_VERSION, RECIPE_IDS_VERSION,
+                       RECIPE_PRODUCTS_VERSION, TAG_VERSION, USER_VERSION,
+                       bump_version)
+
+
+PUBLIC_USER_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'avatar',
+    'avatar_thumbnail',
+}
+
+
+def update_follow_counters(follow, delta):
+    change_counter(User, [follow.author_id], 'followers_count', delta)
+    change_counter(User, [follow.follower_id], 'follows_count', delta)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        update_follow_counters(instance, 1)
+        run_in_background(
+            push_author_to_timeline, instance.follower_id, instance.author_id
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    update_follow_counters(instance, -1)
+    remove_author_from_timeline(instance.follower_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, [instance.author_id], 'recipes_count', 1)
+        run_in_background(push_recipe_to_timelines, instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, [instance.author_id], 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_ids_changed(sender, created=True, **kwargs):
+    if created:
+        transaction.on_commit(partial(bump_version, RECIPE_IDS_VERSION))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Ingredient)
+def recipe_products_changed(sender, created=True, **kwargs):
+    if sender is Ingredient or created:
+        transaction.on_commit(partial(bump_version, RECIPE_PRODUCTS_VERSION))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def collection_item_created(sender, instance, created, **kwargs):
+    if created:
+        apply_collection_changes(
+            sender, instance.user_id, [instance.recipe_id], 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(pre_delete, sender=ShoppingCart)
+def collection_item_deleted(sender, instance, **kwargs):
+    apply_collection_changes(
+        sender, instance.user_id, [instance.recipe_id], -1
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Product)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def public_data_changed(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, DATA_VERSION))
+
+
+@receiver((post_save, post_delete), sender=User)
+def public_user_changed(sender, update_fields=None, **kwargs):
+    if update_fields and not PUBLIC_USER_FIELDS & set(update_fields):
+        return
+    transaction.on_commit(partial(bump_version, DATA_VERSION))
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def user_follows_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        bump_version, USER_VERSION.format(user_id=instance.follower_id)
+    ))
+
+
+@receiver((post_save, post_delete), sender=Product)
+def catalog_changed(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, CATALOG_VERSION))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, TAG_VERSION))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def image_source_changing(sender, instance, update_fields=None, **kwargs):
+    instance.stale_image_variants = clear_image_variants(instance)
+    instance.replaced_source = get_replaced_source(instance, update_fields)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def image_source_changed(sender, instance, **kwargs):
+    source_field, _ = IMAGE_VARIANTS[sender]
+    replaced_name = instance.__dict__.pop('replaced_source', None)
+    if replaced_name:
+        run_in_background(
+            delete_files,
+            getattr(instance, source_field).storage,
+            [replaced_name],
+        )
+    stale_names = instance.__dict__.pop('stale_image_variants', None)
+    if stale_names is None:
+        return
+    if stale_names or getattr(instance, source_field):
+        run_in_background(
+            generate_image_variants, sender, instance.pk, stale_names
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def image_owner_deleted(sender, instance, **kwargs):
+    source_field, variants = IMAGE_VARIANTS[sender]
+    names = [
+        getattr(instance, field_name).name
+        for field_name in (source_field, *variants)
+        if getattr(instance, field_name)
+    ]
+    if names:
+        run_in_background(
+            delete_files, getattr(instance, source_field).storage, names
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_search_changed(sender, instance, **kwargs):
+    schedule_search_update([instance.id])
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_search_changed(sender, instance, **kwargs):
+    schedule_search_update([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_search_changed(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        schedule_search_update([instance.id])
+    elif action == 'post_clear':
+        schedule_search_update(instance.recipes.values_list('id', flat=True))
+    else:
+        schedule_search_update(pk_set)
+
+
+@receiver(post_save, sender=Product)
+def product_search_changed(sender, instance, created, **kwargs):
+    if not created:
+        schedule_search_update(instance.ingredients.values_list(
+            'recipe_id', flat=True
+        ))
+
+
+@receiver(post_save, sender=Tag)
+def tag_search_changed(sender, instance, created, **kwargs):
+    if not created:
+        schedule_search_update(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_search_changed(sender, instance, created, update_fields,
+                          **kwargs):
+    if created or update_fields and not {
+        'username', 'first_name', 'last_name'
+    } & set(update_fields):
+        return
+    schedule_search_update(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_similarity_changed(sender, instance, created, **kwargs):
+    if created:
+        run_batch_in_background(update_similar_recipes, [instance.id])
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_similarity_changed(sender, instance, **kwargs):
+    run_batch_in_background(update_similar_recipes, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def similar_recipe_deleting(sender, instance, **kwargs):
+    run_batch_in_background(
+        update_similar_recipes,
+        instance.similar_to.values_list('recipe_id', flat=True),
+    )
@@ -0,0 +1,154 @@
+import heapq
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .constants import (SIMILAR_BATCH_SIZE, SIMILAR_PRODUCT_RECIPES_MAX,
+                        SIMILAR_RECIPES_LIMIT)
+from .models import Ingredient, Recipe, SimilarRecipe
+
+
+def get_recipe_products(ingredients):
+    recipe_products = defaultdict(set)
+    for recipe_id, product_id in ingredients.values_list(
+        'recipe_id', 'product_id'
+    ).order_by().iterator():
+        recipe_products[recipe_id].add(product_id)
+    return recipe_products
+
+
+def get_postings(recipe_products):
+    postings = defaultdict(list)
+    for recipe_id, product_ids in recipe_products.items():
+        for product_id in product_ids:
+            postings[product_id].append(recipe_id)
+    return {
+        product_id: recipe_ids
+        for product_id, recipe_ids in postings.items()
+        if len(recipe_ids) <= SIMILAR_PRODUCT_RECIPES_MAX
+    }
+
+
+def load_neighborhood(recipe_ids):
+    targets = get_recipe_products(
+        Ingredient.objects.filter(recipe_id__in=recipe_ids)
+    )
+    product_ids = set().union(*targets.values())
+    common_product_ids = Ingredient.objects.filter(
+        product_id__in=product_ids
+    ).order_by().values('product_id').annotate(
+        recipes=Count('recipe_id', distinct=True)
+    ).filter(
+        recipes__gt=SIMILAR_PRODUCT_RECIPES_MAX
+    ).values_list('product_id', flat=True)
+    ingredients = Ingredient.objects.filter(
+        product_id__in=product_ids - set(common_product_ids)
+    )
+    postings = get_postings(get_recipe_products(ingredients))
+    sizes = dict(
+        Ingredient.objects.filter(
+            recipe_id__in=ingredients.values('recipe_id')
+        ).values('recipe_id').annotate(
+            products=Count('product_id', distinct=True)
+        ).values_list('recipe_id', 'products').order_by()
+    )
+    return targets, postings, sizes
+
+
+def score_similar(recipe_id, product_ids, postings, sizes):
+    overlaps = Counter()
+    for product_id in product_ids:
+        overlaps.update(postings.get(product_id, ()))
+    overlaps.pop(recipe_id, None)
+    return {
+        other_id: overlap / (len(product_ids) + sizes[other_id] - overlap)
+        for other_id, overlap in overlaps.items()
+    }
+
+
+def get_top_similar(scores):
+    return heapq.nlargest(
+        SIMILAR_RECIPES_LIMIT,
+        scores.items(),
+        key=lambda item: (item[1], -item[0]),
+    )
+
+
+def save_similar_recipes(neighbors):
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=list(neighbors)).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                          score=score)
+            for recipe_id, similar in neighbors.items()
+            for similar_id, score in similar
+        )
+
+
+def compute_similar_recipes(recipe_ids):
+    targets, postings, sizes = load_neighborhood(recipe_ids)
+    return {
+        recipe_id: score_similar(
+            recipe_id, targets.get(recipe_id, ()), postings, sizes
+        )
+        for recipe_id in recipe_ids
+    }
+
+
+def rebuild_similar_recipes():
+    recipe_products = get_recipe_products(Ingredient.objects.all())
+    postings = get_postings(recipe_products)
+    sizes = {
+        recipe_id: len(product_ids)
+        for recipe_id, product_ids in recipe_products.items()
+    }
+    recipe_ids = list(
+        Recipe.objects.values_list('id', flat=True).order_by('id')
+    )
+    for start in range(0, len(recipe_ids), SIMILAR_BATCH_SIZE):
+        save_similar_recipes({
+            recipe_id: get_top_similar(score_similar(
+                recipe_id, recipe_products.get(recipe_id, ()),
+                postings, sizes,
+            ))
+            for recipe_id in recipe_ids[start:start + SIMILAR_BATCH_SIZE]
+        })
+    return len(recipe_ids)
+
+
+def update_similar_recipes(recipe_ids):
+    recipe_ids = set(recipe_ids)
+    scores = compute_similar_recipes(recipe_ids)
+    stale_ids = set(SimilarRecipe.objects.filter(
+        similar_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    candidate_ids = {
+        other_id
+        for recipe_scores in scores.values()
+        for other_id in recipe_scores
+    } - recipe_ids - stale_ids
+    thresholds = {
+        recipe_id: (count, min_score)
+        for recipe_id, count, min_score in SimilarRecipe.objects.filter(
+            recipe_id__in=candidate_ids
+        ).values('recipe_id').annotate(
+            count=Count('id'), min_score=Min('score')
+        ).values_list('recipe_id', 'count', 'min_score').order_by()
+    }
+    for recipe_scores in scores.values():
+        for other_id, score in recipe_scores.items():
+            if other_id not in candidate_ids:
+                continue
+            count, min_score = thresholds.get(other_id, (0, 0))
+            if count < SIMILAR_RECIPES_LIMIT or score > min_score:
+                stale_ids.add(other_id)
+    stale_ids = sorted(stale_ids - recipe_ids)
+    for start in range(0, len(stale_ids), SIMILAR_BATCH_SIZE):
+        scores.update(compute_similar_recipes(
+            stale_ids[start:start + SIMILAR_BATCH_SIZE]
+        ))
+    save_similar_recipes({
+        recipe_id: get_top_similar(recipe_scores)
+        for recipe_id, recipe_scores in scores.items()
+    })
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        with transaction.atomic():
+            self.acquire(name)
+            if self.exists(name):
+                return name
+            return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'Storage can not find an available filename for "{name}".'
+            )
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(
+                temp_path,
+                self.file_permissions_mode
+                if self.file_permissions_mode is not None else 0o644,
+            )
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def get_stored_files(self):
+        return apps.get_model('recipes', 'StoredFile').objects
+
+    def acquire(self, name):
+        stored_file, _ = self.get_stored_files().select_for_update(
+        ).get_or_create(name=name)
+        stored_file.references += 1
+        stored_file.save(update_fields=['references'])
+
+    def delete(self, name):
+        if not name:
+            return
+        with transaction.atomic():
+            stored_file = self.get_stored_files().select_for_update(
+            ).filter(name=name).first()
+            if stored_file is not None and stored_file.references > 1:
+                stored_file.references -= 1
+                stored_file.save(update_fields=['references'])
+                return
+            if stored_file is not None:
+                stored_file.delete()
+            super().delete(name)
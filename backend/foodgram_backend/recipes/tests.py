@@ -0,0 +1,87 @@
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from .models import Product, ShoppingListItem, StoredFile, User
+from .shopping_lists import change_shopping_lists
+from .storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name)
+
+    def save(self, content):
+        return self.storage.save('images/image.png', ContentFile(content))
+
+    def test_identical_uploads_share_one_counted_file(self):
+        name = self.save(b'image')
+        self.assertEqual(self.save(b'image'), name)
+        self.assertEqual(StoredFile.objects.get(name=name).references, 2)
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_upload_after_delete_restores_file(self):
+        name = self.save(b'image')
+        self.storage.delete(name)
+        self.assertEqual(self.save(b'image'), name)
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+
+class ShoppingListTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@foodgram.ru',
+                username=f'user{number}',
+                password='password',
+            )
+            for number in range(2)
+        ]
+        cls.products = [
+            Product.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(2)
+        ]
+
+    def get_amounts(self):
+        return {
+            (item.user_id, item.product_id): item.amount
+            for item in ShoppingListItem.objects.all()
+        }
+
+    def test_changes_are_upserted(self):
+        first, second = self.products
+        ShoppingListItem.objects.create(
+            user=self.users[0], product=first, amount=100
+        )
+        with self.assertNumQueries(2):
+            change_shopping_lists(
+                [user.id for user in self.users],
+                {first.id: 50, second.id: 20},
+            )
+        self.assertEqual(self.get_amounts(), {
+            (self.users[0].id, first.id): 150,
+            (self.users[0].id, second.id): 20,
+            (self.users[1].id, first.id): 50,
+            (self.users[1].id, second.id): 20,
+        })
+        change_shopping_lists([self.users[0].id], {
+            first.id: -150, second.id: -10,
+        })
+        self.assertEqual(self.get_amounts(), {
+            (self.users[0].id, second.id): 10,
+            (self.users[1].id, first.id): 50,
+            (self.users[1].id, second.id): 20,
+        })
@@ -0,0 +1,126 @@
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .constants import TIMELINE_BATCH_SIZE, TIMELINE_PULL_RECIPES_MIN
+from .models import Follow, Recipe, TimelineEntry, User
+
+
+def is_pulled_author(author_id):
+    return User.objects.filter(
+        id=author_id, recipes_count__gte=TIMELINE_PULL_RECIPES_MIN
+    ).exists()
+
+
+def push_recipe_to_timelines(recipe_id):
+    recipe = Recipe.objects.filter(
+        id=recipe_id, pushed_to_timelines=False
+    ).values('author_id', 'pub_date').first()
+    if recipe is None or is_pulled_author(recipe['author_id']):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=recipe['author_id']
+    ).values_list('follower_id', flat=True).order_by().iterator()
+    while True:
+        batch = list(islice(follower_ids, TIMELINE_BATCH_SIZE))
+        if not batch:
+            break
+        with transaction.atomic():
+            TimelineEntry.objects.bulk_create(
+                (
+                    TimelineEntry(
+                        user_id=follower_id,
+                        recipe_id=recipe_id,
+                        author_id=recipe['author_id'],
+                        pub_date=recipe['pub_date'],
+                    )
+                    for follower_id in batch
+                ),
+                ignore_conflicts=True,
+            )
+    if Recipe.objects.filter(
+        id=recipe_id, pushed_to_timelines=False
+    ).update(pushed_to_timelines=True):
+        push_recipe_to_new_followers(recipe_id, **recipe)
+
+
+def push_recipe_to_new_followers(recipe_id, author_id, pub_date):
+    quote = connection.ops.quote_name
+    entry_columns = ', '.join(
+        quote(TimelineEntry._meta.get_field(name).column)
+        for name in ('user', 'recipe', 'author', 'pub_date')
+    )
+    follower_column, author_column = (
+        quote(Follow._meta.get_field(name).column)
+        for name in ('follower', 'author')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(TimelineEntry._meta.db_table)} '
+            f'({entry_columns}) '
+            f'SELECT {follower_column}, %s, %s, %s '
+            f'FROM {quote(Follow._meta.db_table)} '
+            f'WHERE {author_column} = %s '
+            f'ON CONFLICT DO NOTHING',
+            [
+                recipe_id, author_id,
+                connection.ops.adapt_datetimefield_value(pub_date),
+                author_id,
+            ],
+        )
+
+
+def push_author_to_timeline(user_id, author_id):
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id, pushed_to_timelines=True
+            ).values_list('id', 'pub_date').order_by().iterator()
+        ),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_timeline(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+def get_keyset_filter(position, date_field, id_field):
+    if position is None:
+        return Q()
+    return Q(**{f'{date_field}__lt': position['pub_date']}) | Q(**{
+        date_field: position['pub_date'],
+        f'{id_field}__lt': position['id'],
+    })
+
+
+def get_feed_recipe_ids(user_id, position, limit):
+    author_ids = Follow.objects.filter(
+        follower_id=user_id
+    ).values('author_id')
+    entries = TimelineEntry.objects.filter(
+        get_keyset_filter(position, 'pub_date', 'recipe_id'),
+        user_id=user_id,
+        author_id__in=author_ids,
+    ).values_list('pub_date', 'recipe_id').order_by()
+    pulled_recipes = Recipe.objects.filter(
+        get_keyset_filter(position, 'pub_date', 'id'),
+        author_id__in=author_ids,
+        pushed_to_timelines=False,
+    ).values_list('pub_date', 'id').order_by()
+    return [
+        recipe_id for _, recipe_id
+        in entries.union(pulled_recipes).order_by(
+            '-pub_date', '-recipe_id'
+        )[:limit]
+    ]
@@ -1,12 +1,17 @@
 from django.urls import path
 
-from .views import short_link_reverse
+from .views import legacy_short_link_reverse, short_link_reverse
 
 app_name = 'recipes'
 
 urlpatterns = [
     path(
         's/<int:recipe_id>/',
+        legacy_short_link_reverse,
+        name='legacy_short_link',
+    ),
+    path(
+        's/<str:code>/',
         short_link_reverse,
         name='short_link',
     ),
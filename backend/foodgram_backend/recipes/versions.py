@@ -0,0 +1,30 @@
+import time
+
+from django.core.cache import cache
+
+DATA_VERSION = 'data'
+CATALOG_VERSION = 'catalog'
+TAG_VERSION = 'tags'
+USER_VERSION = 'user:{user_id}'
+RECIPE_IDS_VERSION = 'recipe_ids'
+RECIPE_PRODUCTS_VERSION = 'recipe_products'
+
+
+def get_version_key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    key = get_version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    key = get_version_key(name)
+    version = max(time.time_ns(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, None)
+    return version
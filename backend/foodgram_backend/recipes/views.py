@@ -1,10 +1,19 @@
+from django.http import Http404
 from django.shortcuts import redirect
-from rest_framework.exceptions import ValidationError
 
-from .models import Recipe
+from .indexes import recipe_id_index
+from .short_links import decode_short_code
 
 
-def short_link_reverse(request, recipe_id):
-    if Recipe.objects.filter(pk=recipe_id).exists():
-        return redirect(f'/recipes/{recipe_id}')
-    return ValidationError(f'Рецепта с {recipe_id=} не существует')
+def redirect_to_recipe(recipe_id):
+    if recipe_id is None or recipe_id not in recipe_id_index:
+        raise Http404(f'Рецепта с {recipe_id=} не существует')
+    return redirect(f'/recipes/{recipe_id}')
+
+
+def short_link_reverse(request, code):
+    return redirect_to_recipe(decode_short_code(code))
+
+
+def legacy_short_link_reverse(request, recipe_id):
+    return redirect_to_recipe(recipe_id)